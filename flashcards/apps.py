@@ -3,3 +3,15 @@ from django.apps import AppConfig
 
 class FlashcardsConfig(AppConfig):
     name = 'flashcards'
+
+    def ready(self):
+        from .assets import build_assets
+        from .auth_backends import connect_signals
+        from .command_metrics import register
+        from .search import get_index
+        connect_signals()
+        # До создания клиентов djongo и mongo.get_client, чтобы слушатель попал в оба
+        register()
+        # Строим поисковый индекс и JSON словаря заранее, а не на первом запросе
+        get_index()
+        build_assets()
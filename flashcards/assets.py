@@ -0,0 +1,72 @@
+"""Версионированные JSON-файлы словаря по уровням HSK.
+
+Каждый уровень сериализуется один раз при старте, сжимается заранее (gzip и,
+если установлен пакет brotli, br) и отдаётся по адресу с хешем содержимого,
+поэтому браузер может кешировать его без повторных запросов.
+"""
+import gzip
+import hashlib
+import json
+
+from django.urls import reverse
+
+from . import vocabulary
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class VocabularyAsset:
+    __slots__ = ('level', 'body', 'version', 'etag', 'encoded')
+
+    def __init__(self, level, body):
+        self.level = level
+        self.body = body
+        self.version = hashlib.sha256(body).hexdigest()[:16]
+        self.etag = f'"{self.version}"'
+        self.encoded = {'gzip': gzip.compress(body, compresslevel=9)}
+        if brotli is not None:
+            self.encoded['br'] = brotli.compress(body)
+
+    def url(self):
+        return reverse('vocabulary_json', args=[self.level, self.version])
+
+
+_assets = None
+
+
+def build_assets():
+    global _assets
+    assets = {}
+    for level in vocabulary.LEVELS:
+        body = json.dumps(vocabulary.level_dict(level), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        assets[level] = VocabularyAsset(level, body)
+    _assets = assets
+    return assets
+
+
+def get_asset(level):
+    if _assets is None:
+        build_assets()
+    return _assets.get(level)
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding, кроме явно запрещённых через q=0."""
+    encodings = set()
+    for item in header.split(','):
+        parts = [part.strip() for part in item.split(';')]
+        if not parts[0]:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            encodings.add(parts[0].lower())
+    return encodings
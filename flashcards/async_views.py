@@ -0,0 +1,144 @@
+"""Асинхронные версии end_game и dictionary_search для запуска под ASGI.
+
+Подключаются в urls.py при ASYNC_VIEWS=1 вместо синхронных из views.py.
+Запись ответов идёт через motor (mongo.get_async_db), поэтому ожидание
+MongoDB не занимает поток воркера: один процесс uvicorn обслуживает сотни
+одновременных игр. Операции MongoDB и правила записи — те же, что в
+синхронных представлениях (game_sessions, word_stats, scheduler).
+
+Синхронной остаётся загрузка пользователя из сессии: она выполняется в
+потоке через sync_to_async. Команды motor идут из его
+пула потоков без контекста запроса, поэтому попадают в /metrics, но не в
+заголовок Server-Timing.
+"""
+import asyncio
+import datetime
+import functools
+import json
+
+from asgiref.sync import sync_to_async
+from bson import ObjectId
+from django.contrib.auth.views import redirect_to_login
+from django.http import JsonResponse
+from django.shortcuts import redirect
+from pymongo.errors import BulkWriteError
+
+from . import page_cache
+from .game_sessions import (
+    END_FIELDS, GAME_SESSIONS, apply_compact_async, apply_legacy_async, events_history, normalize_events,
+)
+from .mongo import get_async_db
+from .scheduler import SRS_REVIEWS, review_requests
+from .search import search_page
+from .session_codecs import is_compact
+from .views import end_game_logger, search_logger
+from .word_stats import WORD_STATS, answer_requests, only_duplicate_upserts
+
+
+def async_login_required(view):
+    """login_required для корутин: пользователь из сессии загружается в потоке (ORM синхронный)."""
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+        if not is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+
+    # csrf_exempt из Django 3.1 превращает корутину в обычную функцию, поэтому флаг ставим сами
+    wrapper.csrf_exempt = True
+    return wrapper
+
+
+async def _bulk_upsert(collection, requests):
+    if not requests:
+        return
+    try:
+        await collection.bulk_write(requests, ordered=False)
+    except BulkWriteError as e:
+        if not only_duplicate_upserts(e):
+            raise
+
+
+@async_login_required
+async def end_game(request, session_id):
+    if not session_id or session_id == 'None':
+        end_game_logger.warning('Invalid session_id received: %r', session_id)
+        return JsonResponse({'status': 'error', 'message': 'Invalid session ID'}, status=400)
+
+    db = get_async_db()
+    user_id = request.user.id
+
+    try:
+        session_oid = ObjectId(session_id)
+        session = await db[GAME_SESSIONS].find_one({'_id': session_oid, 'user_id': user_id}, END_FIELDS)
+        if not session:
+            end_game_logger.info('Session not found for ID: %s', session_id)
+            return JsonResponse({'status': 'error', 'message': 'Session not found'}, status=404)
+
+        if request.method == 'POST':
+            data = json.loads(request.body)
+            is_finished = data.get('is_finished', False)
+            now = datetime.datetime.now()
+
+            last_seq = session.get('last_seq', 0)
+            events = normalize_events(data.get('events', []), last_seq)
+            answer_history = data.get('answer_history', {})
+            legacy = {field: data[field] for field in ('correct_answers', 'total_answers', 'remaining_cards') if field in data}
+
+            if is_compact(session):
+                result = await apply_compact_async(
+                    db, session_oid, user_id, events, session=session, answer_history=answer_history,
+                    legacy=legacy, is_finished=is_finished, now=now,
+                )
+                applied = result[1] if result else []
+            else:
+                applied = await apply_legacy_async(
+                    db, session, user_id, events, answer_history=answer_history, legacy=legacy,
+                    is_finished=is_finished, now=now,
+                )
+            end_game_logger.debug('Saved session %s: events=%d is_finished=%s', session_id, len(events), is_finished)
+            await db[page_cache.DASHBOARD_VERSIONS].update_one(*page_cache.version_bump(user_id), upsert=True)
+
+            category = session['category']
+            if applied:
+                # Статистика слов и расписание повторений — разные коллекции, пишем параллельно
+                history = events_history(applied)
+                await asyncio.gather(
+                    _bulk_upsert(db[WORD_STATS], answer_requests(user_id, category, history, session_oid, now)),
+                    _bulk_upsert(db[SRS_REVIEWS], review_requests(user_id, category, history, session_oid, now)),
+                )
+            await _bulk_upsert(db[WORD_STATS], answer_requests(user_id, category, answer_history, session_oid, now))
+
+            acked_seq = max([last_seq] + [event['seq'] for event in events])
+            return JsonResponse({'status': 'success', 'last_seq': acked_seq})
+        return redirect('home')
+    except json.JSONDecodeError as e:
+        end_game_logger.warning('JSON decode error for session %s: %s', session_id, e)
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
+    except ValueError as e:
+        end_game_logger.warning('Invalid events for session %s: %s', session_id, e)
+        return JsonResponse({'status': 'error', 'message': 'Invalid events'}, status=400)
+    except Exception:
+        end_game_logger.exception('Error querying session with ID %s', session_id)
+        return JsonResponse({'status': 'error', 'message': 'Invalid session ID'}, status=400)
+
+
+@async_login_required
+async def dictionary_search(request):
+    # Поиск идёт по индексу в памяти (строится при старте), без обращений к MongoDB:
+    # асинхронная версия лишь не занимает под запрос поток воркера
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            page = search_page(data)
+            search_logger.debug('Search query %r: %d of %d results', data.get('query'), len(page['results']), page['total'])
+            return JsonResponse(page)
+        except json.JSONDecodeError as e:
+            search_logger.warning('JSON decode error: %s', e)
+            return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
+        except (AttributeError, ValueError) as e:
+            search_logger.warning('Invalid search parameters: %s', e)
+            return JsonResponse({'status': 'error', 'message': 'Invalid search parameters'}, status=400)
+
+    return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=400)
@@ -0,0 +1,107 @@
+"""Бэкенд аутентификации с кешем пользователей в памяти процесса.
+
+request.user загружается на каждом запросе через djongo; кеш с ограниченным
+временем жизни убирает этот запрос к базе на горячем пути. Записи
+сбрасываются при сохранении или удалении пользователя (смена пароля,
+правка в админке) и при выходе из аккаунта.
+
+Кеш свой у каждого процесса, и сигналы сбрасывают запись только в том
+воркере, который обработал изменение. Остальные воркеры gunicorn до
+USER_CACHE_TTL секунд продолжают видеть прежнего пользователя — в том числе
+отключённого или со старым паролем, — поэтому TTL держится коротким.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_delete, post_save
+
+
+class UserCache:
+    """LRU-кеш с TTL и счётчиками попаданий."""
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'size': len(self._entries),
+            }
+
+
+user_cache = UserCache(settings.USER_CACHE_TTL, settings.USER_CACHE_MAX_SIZE)
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        user = user_cache.get(user_id)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            user_cache.set(user_id, user)
+        # Каждый запрос получает свою копию: кеши прав и изменения полей
+        # не должны попадать в общий объект
+        return copy.deepcopy(user)
+
+
+def _invalidate_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+
+
+def _invalidate_on_logout(sender, request, user, **kwargs):
+    if user is not None:
+        user_cache.invalidate(user.pk)
+
+
+def connect_signals():
+    user_model = get_user_model()
+    post_save.connect(_invalidate_user, sender=user_model, dispatch_uid='user_cache_post_save')
+    post_delete.connect(_invalidate_user, sender=user_model, dispatch_uid='user_cache_post_delete')
+    user_logged_out.connect(_invalidate_on_logout, dispatch_uid='user_cache_logout')
@@ -0,0 +1,162 @@
+"""Учёт команд MongoDB по запросам и журнал медленных запросов.
+
+Слушатель команд pymongo регистрируется глобально, поэтому видит и запросы
+djongo, и прямые вызовы pymongo из представлений. Пока идёт HTTP-запрос,
+число команд, объём переданных данных и суммарное время базы копятся в
+RequestStats из contextvar; middleware отдаёт итог в заголовке
+Server-Timing. Команды дольше MONGO_SLOW_QUERY_MS пишутся в лог вместе с
+формой фильтра — значения заменены на '?', чтобы не попадали данные.
+"""
+import contextlib
+import contextvars
+import logging
+import threading
+
+import bson
+from django.conf import settings
+from pymongo import monitoring
+
+from . import metrics
+from .middleware import HybridMiddleware
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger('flashcards.mongo.slow')
+
+current_stats = contextvars.ContextVar('mongo_request_stats', default=None)
+
+# Поле команды, в котором лежит фильтр или пайплайн
+_FILTER_FIELDS = {
+    'find': 'filter',
+    'aggregate': 'pipeline',
+    'count': 'query',
+    'distinct': 'query',
+    'findAndModify': 'query',
+    'update': 'updates',
+    'delete': 'deletes',
+}
+
+
+class RequestStats:
+    __slots__ = ('commands', 'by_name', 'duration_micros', 'bytes_sent', 'bytes_received', 'failures')
+
+    def __init__(self):
+        self.commands = 0
+        self.by_name = {}
+        self.duration_micros = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.failures = 0
+
+    @property
+    def duration_ms(self):
+        return self.duration_micros / 1000
+
+    def as_dict(self):
+        return {
+            'commands': self.commands,
+            'by_name': dict(self.by_name),
+            'duration_ms': round(self.duration_ms, 3),
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'failures': self.failures,
+        }
+
+
+def shape(value):
+    """Форма фильтра: ключи и операторы сохраняются, значения заменяются на '?'."""
+    if isinstance(value, dict):
+        return {key: shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, dict) for item in value):
+            return [shape(item) for item in value]
+        return '?'
+    return '?'
+
+
+def command_shape(command_name, command):
+    field = _FILTER_FIELDS.get(command_name)
+    if field is None or field not in command:
+        return None
+    value = command[field]
+    if command_name in ('update', 'delete'):
+        return [shape(item.get('q', {})) for item in value]
+    return shape(value)
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    def __init__(self):
+        self._local = threading.local()
+
+    def _pending(self):
+        pending = getattr(self._local, 'pending', None)
+        if pending is None:
+            pending = self._local.pending = {}
+        return pending
+
+    def started(self, event):
+        stats = current_stats.get()
+        if stats is not None and settings.MONGO_COMMAND_BYTES:
+            stats.bytes_sent += len(bson.encode(event.command))
+        # Сама команда нужна, только если она окажется медленной
+        self._pending()[event.request_id] = (event.database_name, event.command)
+
+    def succeeded(self, event):
+        self._finish(event)
+        stats = current_stats.get()
+        if stats is not None and settings.MONGO_COMMAND_BYTES:
+            stats.bytes_received += len(bson.encode(event.reply))
+
+    def failed(self, event):
+        self._finish(event)
+        stats = current_stats.get()
+        if stats is not None:
+            stats.failures += 1
+
+    def _finish(self, event):
+        database_name, command = self._pending().pop(event.request_id, (None, None))
+        metrics.observe_command(event.command_name, event.duration_micros / 1_000_000)
+        stats = current_stats.get()
+        if stats is not None:
+            stats.commands += 1
+            stats.by_name[event.command_name] = stats.by_name.get(event.command_name, 0) + 1
+            stats.duration_micros += event.duration_micros
+        if command is not None and event.duration_micros >= settings.MONGO_SLOW_QUERY_MS * 1000:
+            slow_logger.warning(
+                'Slow MongoDB %s on %s.%s: %.1f ms, shape=%s',
+                event.command_name, database_name, command.get(event.command_name),
+                event.duration_micros / 1000, command_shape(event.command_name, command),
+            )
+
+
+command_metrics = CommandMetricsListener()
+_registered = False
+
+
+def register():
+    """Регистрирует слушатель для всех клиентов, созданных после вызова (djongo и mongo.get_client)."""
+    global _registered
+    if not _registered:
+        monitoring.register(command_metrics)
+        _registered = True
+
+
+class MongoTimingMiddleware(HybridMiddleware):
+    """Считает команды MongoDB запроса и добавляет заголовок Server-Timing."""
+
+    @contextlib.contextmanager
+    def scope(self, request):
+        request.mongo_stats = RequestStats()
+        token = current_stats.set(request.mongo_stats)
+        try:
+            yield
+        finally:
+            current_stats.reset(token)
+
+    def finish(self, request, response):
+        stats = request.mongo_stats
+        desc = f'{stats.commands} commands'
+        if settings.MONGO_COMMAND_BYTES:
+            desc += f', {stats.bytes_sent} B sent, {stats.bytes_received} B received'
+        response['Server-Timing'] = f'mongo;dur={stats.duration_ms:.3f};desc="{desc}"'
+        logger.debug('%s %s: mongo %s', request.method, request.path, stats.as_dict())
+        return response
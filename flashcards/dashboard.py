@@ -0,0 +1,153 @@
+"""Данные дашбордов: главная страница и статистика."""
+import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.utils import timezone
+
+from . import vocabulary, word_stats
+
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
+HISTORY_FIELDS = {'category': 1, 'correct_answers': 1, 'total_answers': 1, 'created_at': 1, 'deck_size': 1}
+
+
+def dashboard_pipeline(user_id):
+    completed = [
+        {'category': category, 'total_answers': size}
+        for category, size in vocabulary.LEVEL_SIZES.items()
+    ]
+    return [
+        {'$match': {'user_id': user_id}},
+        {'$facet': {
+            'totals': [
+                {'$group': {
+                    '_id': '$category',
+                    'correct': {'$sum': '$correct_answers'},
+                    'total': {'$sum': '$total_answers'},
+                }},
+            ],
+            # Лучший результат среди полностью пройденных сессий
+            'best': [
+                {'$match': {'$or': completed}},
+                {'$group': {'_id': '$category', 'best_percentage': {'$max': '$percentage'}}},
+            ],
+        }},
+    ]
+
+
+def _word_data(row):
+    category = row['category']
+    character = row['character']
+    word = vocabulary.get_word(category, character)
+    return {
+        'character': character,
+        'pinyin': word.pinyin if word else '',
+        'meaning': word.meaning if word else '',
+        'percentage': round(row['accuracy'] * 100, 1),
+    }
+
+
+def load_dashboard(db, user_id):
+    """Возвращает (stats, weak_words, strong_words).
+
+    Итоги по уровням считаются одной агрегацией по сессиям, а слабые и сильные
+    слова берутся из word_stats индексными запросами.
+    """
+    facets = next(db['flashcards_gamesession'].aggregate(dashboard_pipeline(user_id)), {})
+
+    stats = {category: {'correct': 0, 'total': 0, 'percentage': 0.0} for category in vocabulary.LEVELS}
+    for row in facets.get('totals', []):
+        if row['_id'] not in stats:
+            continue
+        category_stats = stats[row['_id']]
+        category_stats['correct'] = row['correct']
+        category_stats['total'] = row['total']
+        if row['total'] > 0:
+            category_stats['percentage'] = round((row['correct'] / row['total']) * 100, 1)
+    for row in facets.get('best', []):
+        if row['_id'] in stats:
+            stats[row['_id']]['best_percentage'] = row['best_percentage']
+
+    weak, strong = word_stats.top_words(db, user_id)
+    weak_words = [_word_data(row) for row in weak]
+    strong_words = [_word_data(row) for row in strong]
+    return stats, weak_words, strong_words
+
+
+def encode_cursor(session):
+    """Курсор страницы истории: created_at в миллисекундах и _id последней строки."""
+    created_at = session['created_at']
+    if timezone.is_aware(created_at):
+        created_at = timezone.make_naive(created_at, datetime.timezone.utc)
+    millis = (created_at - datetime.datetime(1970, 1, 1)) // datetime.timedelta(milliseconds=1)
+    return f'{millis}_{session["_id"]}'
+
+
+def decode_cursor(cursor):
+    """Разбирает курсор; ValueError, если он испорчен."""
+    millis, _, session_id = cursor.partition('_')
+    try:
+        created_at = datetime.datetime(1970, 1, 1) + datetime.timedelta(milliseconds=int(millis))
+        return created_at, ObjectId(session_id)
+    except (InvalidId, TypeError, OverflowError) as e:
+        raise ValueError(f'Invalid cursor: {cursor!r}') from e
+
+
+def history_filter(user_id, cursor=None):
+    query = {'user_id': user_id}
+    if cursor:
+        created_at, session_id = decode_cursor(cursor)
+        # Keyset по (created_at, _id): строки строго после последней показанной
+        query['$or'] = [
+            {'created_at': {'$lt': created_at}},
+            {'created_at': created_at, '_id': {'$lt': session_id}},
+        ]
+    return query
+
+
+def load_history_page(db, user_id, cursor=None, limit=HISTORY_PAGE_SIZE):
+    """Возвращает (sessions, next_cursor) — страницу истории от новых к старым.
+
+    Запрашивается на одну строку больше, чтобы узнать, есть ли следующая
+    страница, без отдельного count.
+    """
+    rows = list(
+        db['flashcards_gamesession']
+        .find(history_filter(user_id, cursor), HISTORY_FIELDS)
+        .sort([('created_at', -1), ('_id', -1)])
+        .limit(limit + 1)
+    )
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    sessions = []
+    for row in rows[:limit]:
+        # Сессия повторения идёт по своей колоде, а не по всему уровню
+        total_cards = row.get('deck_size') or vocabulary.level_size(row.get('category'))
+        correct_answers = row.get('correct_answers', 0)
+        created_at = row.get('created_at')
+        if created_at is not None and timezone.is_naive(created_at):
+            created_at = timezone.make_aware(created_at, datetime.timezone.utc)
+        sessions.append({
+            'id': str(row['_id']),
+            'created_at': created_at,
+            'category': row.get('category'),
+            'correct_answers': correct_answers,
+            'total_answers': row.get('total_answers', 0),
+            'total_cards': total_cards,
+            'calculated_percentage': round((correct_answers / total_cards) * 100, 1) if total_cards > 0 else 0.0,
+        })
+    return sessions, next_cursor
+
+
+def best_by_level(db, user_id):
+    """Лучший процент освоения по уровням для графика на странице статистики."""
+    stats = {category: {'best_percentage': 0.0} for category in vocabulary.LEVELS}
+    pipeline = [
+        {'$match': {'user_id': user_id, 'mode': {'$exists': False}}},
+        {'$group': {'_id': '$category', 'best_correct': {'$max': '$correct_answers'}}},
+    ]
+    for row in db['flashcards_gamesession'].aggregate(pipeline):
+        total_cards = vocabulary.level_size(row['_id'])
+        if row['_id'] in stats and total_cards > 0:
+            stats[row['_id']]['best_percentage'] = round((row['best_correct'] / total_cards) * 100, 1)
+    return stats
@@ -2,24 +2,25 @@ from django import forms
 from .models import Card
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
-from .hsk_data import HSK1_CHARACTERS
-from .hsk2_data import HSK2_CHARACTERS
+from . import vocabulary
 
 class CardForm(forms.ModelForm):
-    CATEGORY_CHOICES = [
-        ('HSK1', 'HSK 1'),
-        ('HSK2', 'HSK 2'),
-        ('HSK3', 'HSK 3'),
-    ]
+    CATEGORY_CHOICES = [(level, level.replace('HSK', 'HSK ')) for level in vocabulary.LEVELS]
     
     category = forms.ChoiceField(
         choices=CATEGORY_CHOICES,
         widget=forms.Select(attrs={'id': 'category-select'})
     )
     
-    # Инициализация пустого списка для иероглифов (будет заполняться в JavaScript)
-    character = forms.ChoiceField(
-        choices=[],
+    # Поиск по уровню: список иероглифов подгружается постранично через API
+    character_filter = forms.CharField(
+        label='Поиск',
+        required=False,
+        widget=forms.TextInput(attrs={'id': 'character-filter', 'placeholder': 'Иероглиф, пиньинь или перевод'})
+    )
+
+    # Варианты заполняются в JavaScript; допустимость проверяется в clean()
+    character = forms.CharField(
         widget=forms.Select(attrs={'id': 'character-select'})
     )
     
@@ -37,27 +38,15 @@ class CardForm(forms.ModelForm):
             'pinyin': forms.TextInput(attrs={'id': 'pinyin-field'}),
         }
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        data = args[0] if args else None
-        category = None
-        if data:
-            category = data.get('category', None)
-        if not category and 'initial' in kwargs:
-            category = kwargs['initial'].get('category')
-        if category in ['HSK1', 'HSK2', 'HSK3']:
-            from .hsk_data import HSK1_CHARACTERS
-            from .hsk2_data import HSK2_CHARACTERS
-            from .hsk3_data import HSK3_CHARACTERS
-            hsk_map = {
-                'HSK1': HSK1_CHARACTERS,
-                'HSK2': HSK2_CHARACTERS,
-                'HSK3': HSK3_CHARACTERS,
-            }
-            chars = hsk_map[category]
-            self.fields['character'].choices = [(char, char) for char in chars]
-        else:
-            self.fields['character'].choices = []
+    field_order = ['category', 'character_filter', 'character', 'pinyin', 'meaning']
+
+    def clean(self):
+        cleaned_data = super().clean()
+        category = cleaned_data.get('category')
+        character = cleaned_data.get('character')
+        if category and character and character not in vocabulary.level_characters(category):
+            self.add_error('character', 'Выберите иероглиф из выбранного уровня HSK.')
+        return cleaned_data
 
 class RegisterForm(UserCreationForm):
     class Meta:
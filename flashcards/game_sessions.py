@@ -0,0 +1,351 @@
+"""Атомарные обновления игровых сессий по отдельным ответам и пачкам ответов."""
+import datetime
+
+from bson import ObjectId
+from django.conf import settings
+from pymongo import ReturnDocument, UpdateOne
+
+from . import vocabulary
+from .session_codecs import SCHEMA_COMPACT, CompactSession, decode_bits, is_compact
+
+GAME_SESSIONS = 'flashcards_gamesession'
+# Поля, нужные странице игры; answer_history на старте не читается
+START_FIELDS = {
+    'correct_answers': 1, 'total_answers': 1, 'remaining_cards': 1, 'last_seq': 1,
+    'schema': 1, 'remaining_bits': 1, 'deck_size': 1,
+}
+# Поля компактной сессии для чтения-изменения-записи
+COMPACT_STATE_FIELDS = {
+    'category': 1, 'schema': 1, 'rev': 1, 'last_seq': 1, 'is_finished': 1,
+    'correct_answers': 1, 'total_answers': 1,
+    'remaining_bits': 1, 'history_correct': 1, 'history_total': 1,
+}
+# end_game читает и старую, и компактную сессию одним запросом
+END_FIELDS = {**COMPACT_STATE_FIELDS, 'remaining_cards': 1}
+COMPACT_RETRIES = 5
+
+
+def compact_enabled():
+    return settings.GAME_SESSION_SCHEMA == 'compact'
+
+
+def _new_session_fields(category, cards=None):
+    if cards is None:
+        cards = [word.character for word in vocabulary.level_words(category)]
+    if compact_enabled():
+        state = CompactSession.new(category)
+        state.set_remaining(cards)
+        return {'schema': SCHEMA_COMPACT, 'rev': 0, **state.to_fields()}
+    return {'remaining_cards': cards, 'answer_history': {}}
+
+
+def active_filter(user_id, category, mode=None):
+    """Незавершённая сессия уровня; у обычных сессий поля mode нет."""
+    return {
+        'user_id': user_id,
+        'category': category,
+        'is_finished': False,
+        'mode': mode if mode else {'$exists': False},
+    }
+
+
+def _decode_start(session, category):
+    if session is not None and is_compact(session):
+        words = vocabulary.level_words(category)
+        session['remaining_cards'] = [
+            words[index].character for index in decode_bits(session.pop('remaining_bits'), len(words))
+        ]
+    return session
+
+
+def find_session(db, user_id, category, mode=None):
+    """Активная сессия с полями START_FIELDS или None."""
+    return _decode_start(db[GAME_SESSIONS].find_one(active_filter(user_id, category, mode), START_FIELDS), category)
+
+
+def start_session(db, user_id, category, now=None, mode=None, cards=None):
+    """Возвращает (session, created): активную сессию уровня или новую.
+
+    Одна операция find_one_and_update с upsert: поля новой сессии задаются
+    через $setOnInsert и не трогают уже начатую. _id новой сессии выбирается
+    заранее — по нему видно, была ли вставка. cards — колода новой сессии,
+    по умолчанию все слова уровня.
+    """
+    now = now or datetime.datetime.now()
+    new_id = ObjectId()
+    fields = _new_session_fields(category, cards)
+    if cards is not None:
+        fields['deck_size'] = len(cards)
+    session = db[GAME_SESSIONS].find_one_and_update(
+        active_filter(user_id, category, mode),
+        {'$setOnInsert': {
+            '_id': new_id,
+            **fields,
+            'correct_answers': 0,
+            'total_answers': 0,
+            'percentage': 0.0,
+            'last_seq': 0,
+            'created_at': now,
+            'updated_at': now,
+        }},
+        projection=START_FIELDS,
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return _decode_start(session, category), session['_id'] == new_id
+
+
+def answer_filter(session_id, user_id, character, seq=None):
+    # Карточка должна ещё оставаться в сессии: повтор того же ответа
+    # ничего не найдёт и не будет посчитан дважды.
+    query = {
+        '_id': session_id,
+        'user_id': user_id,
+        'is_finished': False,
+        'remaining_cards': character,
+    }
+    if seq is not None:
+        # Совпадает и со старыми сессиями, у которых last_seq ещё нет
+        query['last_seq'] = {'$not': {'$gte': seq}}
+    return query
+
+
+def answer_update(character, correct, now=None, seq=None):
+    correct = int(bool(correct))
+    update = {
+        '$inc': {
+            'total_answers': 1,
+            'correct_answers': correct,
+            f'answer_history.{character}.total': 1,
+            f'answer_history.{character}.correct': correct,
+        },
+        '$pull': {'remaining_cards': character},
+        '$set': {'updated_at': now or datetime.datetime.now()},
+    }
+    if seq is not None:
+        update['$max'] = {'last_seq': seq}
+    return update
+
+
+def apply_answer(db, session_id, user_id, character, correct, seq=None):
+    """Записывает один ответ. Возвращает категорию сессии или None, если ответ не применён.
+
+    Сессия в старой схеме обновляется одной операцией find_one_and_update.
+    Компактная сессия под answer_filter не подходит (remaining_cards у неё
+    нет), и только тогда ответ пишется через apply_compact.
+    """
+    session = db[GAME_SESSIONS].find_one_and_update(
+        answer_filter(session_id, user_id, character, seq),
+        answer_update(character, correct, seq=seq),
+        projection={'_id': 0, 'category': 1},
+    )
+    if session is not None:
+        return session['category']
+    result = apply_compact(db, session_id, user_id, [{'seq': seq, 'character': character, 'correct': correct}])
+    if result is None:
+        return None
+    category, applied = result
+    return category if applied else None
+
+
+def normalize_events(events, last_seq=0):
+    """Проверяет пачку ответов клиента и оставляет только ещё не применённые.
+
+    Событие — {'seq': int, 'character': str, 'correct': bool}. Возвращает
+    список без повторов, упорядоченный по seq.
+    """
+    if not isinstance(events, list):
+        raise ValueError('events must be a list')
+    by_seq = {}
+    for event in events:
+        if not isinstance(event, dict):
+            raise ValueError('event must be an object')
+        seq = event.get('seq')
+        character = event.get('character')
+        if not isinstance(seq, int) or isinstance(seq, bool) or seq <= 0:
+            raise ValueError('invalid seq')
+        if not isinstance(character, str) or not character:
+            raise ValueError('invalid character')
+        if seq > last_seq:
+            by_seq[seq] = {'seq': seq, 'character': character, 'correct': bool(event.get('correct'))}
+    return [by_seq[seq] for seq in sorted(by_seq)]
+
+
+def select_events(session, events):
+    """События, которые применятся к прочитанной сессии в старой схеме.
+
+    Решение принимается по уже прочитанному документу (END_FIELDS): в
+    завершённую сессию ответы не пишутся, на каждую оставшуюся карточку
+    засчитывается первый ответ.
+    """
+    if session.get('is_finished', False):
+        return []
+    remaining = set(session.get('remaining_cards') or [])
+    applied = []
+    for event in events:
+        if event['character'] in remaining:
+            remaining.discard(event['character'])
+            applied.append(event)
+    return applied
+
+
+def apply_legacy(db, session, user_id, events, answer_history=None, legacy=None, is_finished=False, now=None):
+    """Сохраняет сессию в старой схеме одним bulk_write. Возвращает применённые события.
+
+    session — документ, прочитанный с END_FIELDS. Каждое событие остаётся
+    отдельным UpdateOne с answer_filter: если сессию успели изменить
+    параллельно, фильтр не совпадёт, и тогда события в статистику не идут.
+    """
+    applied = select_events(session, events)
+    requests = end_requests(session['_id'], user_id, applied, answer_history, legacy, is_finished, now)
+    if requests and db[GAME_SESSIONS].bulk_write(requests, ordered=True).matched_count < len(requests):
+        return []
+    return applied
+
+
+async def apply_legacy_async(db, session, user_id, events, answer_history=None, legacy=None, is_finished=False,
+                             now=None):
+    """apply_legacy для асинхронного драйвера (motor)."""
+    applied = select_events(session, events)
+    requests = end_requests(session['_id'], user_id, applied, answer_history, legacy, is_finished, now)
+    if requests and (await db[GAME_SESSIONS].bulk_write(requests, ordered=True)).matched_count < len(requests):
+        return []
+    return applied
+
+
+def events_history(events):
+    """Сводит события в формат answer_history: {character: {'correct', 'total'}}."""
+    history = {}
+    for event in events:
+        counters = history.setdefault(event['character'], {'correct': 0, 'total': 0})
+        counters['total'] += 1
+        counters['correct'] += int(event['correct'])
+    return history
+
+
+def compact_write(session, events, answer_history=None, legacy=None, is_finished=False, now=None):
+    """Изменение компактной сессии в памяти: (применённые события, filter, update).
+
+    filter и update — None, если писать нечего. Фильтр проверяет rev, с
+    которым документ был прочитан.
+    """
+    legacy = legacy or {}
+    state = CompactSession.from_document(session)
+    last_seq = session.get('last_seq', 0)
+    correct_answers = session.get('correct_answers', 0)
+    total_answers = session.get('total_answers', 0)
+    applied = []
+    if not session.get('is_finished', False):
+        for event in events:
+            seq = event.get('seq')
+            if seq is not None and seq <= last_seq:
+                continue
+            if state.answer(event['character'], event['correct']):
+                applied.append(event)
+                correct_answers += int(bool(event['correct']))
+                total_answers += 1
+    if answer_history:
+        state.merge_history(answer_history)
+    if 'remaining_cards' in legacy:
+        state.set_remaining(legacy['remaining_cards'])
+    correct_answers = legacy.get('correct_answers', correct_answers)
+    total_answers = legacy.get('total_answers', total_answers)
+
+    if not (applied or answer_history or legacy or is_finished):
+        return applied, None, None
+
+    fields = {
+        **state.to_fields(),
+        'correct_answers': correct_answers,
+        'total_answers': total_answers,
+        'last_seq': max([last_seq] + [event['seq'] for event in applied if event.get('seq') is not None]),
+        'updated_at': now,
+    }
+    if is_finished or legacy:
+        fields['is_finished'] = is_finished
+        fields['percentage'] = correct_answers / total_answers * 100 if total_answers > 0 else 0.0
+    query = {'_id': session['_id'], 'rev': session['rev'] if 'rev' in session else {'$exists': False}}
+    return applied, query, {'$set': fields, '$inc': {'rev': 1}}
+
+
+def apply_compact(db, session_id, user_id, events, session=None, answer_history=None, legacy=None,
+                  is_finished=False, now=None):
+    """Применяет ответы к компактной сессии: чтение, изменение в памяти, запись.
+
+    Запись проходит только при неизменном rev документа; при гонке состояние
+    перечитывается. session — уже прочитанный документ с COMPACT_STATE_FIELDS,
+    legacy — поля correct_answers/total_answers/remaining_cards от старых
+    клиентов. Возвращает (категория, применённые события) или None, если
+    сессия не найдена или хранится в старой схеме.
+    """
+    now = now or datetime.datetime.now()
+    legacy = legacy or {}
+    for _ in range(COMPACT_RETRIES):
+        if session is None:
+            session = db[GAME_SESSIONS].find_one({'_id': session_id, 'user_id': user_id}, COMPACT_STATE_FIELDS)
+        if session is None or not is_compact(session):
+            return None
+        applied, query, update = compact_write(session, events, answer_history, legacy, is_finished, now)
+        if query is None or db[GAME_SESSIONS].update_one(query, update).matched_count:
+            return session['category'], applied
+        session = None
+    raise RuntimeError(f'Session {session_id} was changed concurrently {COMPACT_RETRIES} times')
+
+
+async def apply_compact_async(db, session_id, user_id, events, session=None, answer_history=None, legacy=None,
+                              is_finished=False, now=None):
+    """apply_compact для асинхронного драйвера (motor): те же шаги, но с await."""
+    now = now or datetime.datetime.now()
+    legacy = legacy or {}
+    for _ in range(COMPACT_RETRIES):
+        if session is None:
+            session = await db[GAME_SESSIONS].find_one({'_id': session_id, 'user_id': user_id}, COMPACT_STATE_FIELDS)
+        if session is None or not is_compact(session):
+            return None
+        applied, query, update = compact_write(session, events, answer_history, legacy, is_finished, now)
+        if query is None or (await db[GAME_SESSIONS].update_one(query, update)).matched_count:
+            return session['category'], applied
+        session = None
+    raise RuntimeError(f'Session {session_id} was changed concurrently {COMPACT_RETRIES} times')
+
+
+def end_requests(session_id, user_id, events=(), answer_history=None, legacy=None, is_finished=False, now=None):
+    """Операции bulk_write для end_game по сессии в старой схеме (ordered=True).
+
+    Сначала ответы events, затем итоговый процент, чтобы он учёл новые
+    ответы. legacy — счётчики и оставшиеся карточки от старых клиентов:
+    меняются, только если клиент их прислал.
+    """
+    now = now or datetime.datetime.now()
+    legacy = legacy or {}
+    requests = [
+        UpdateOne(
+            answer_filter(session_id, user_id, event['character'], event['seq']),
+            answer_update(event['character'], event['correct'], now, event['seq']),
+        )
+        for event in events
+    ]
+
+    # Старые клиенты присылают накопленную историю при каждом сохранении:
+    # $max засчитывает её один раз и не затирает ответы, пришедшие событиями
+    history_max = {}
+    for character, history in (answer_history or {}).items():
+        history_max[f'answer_history.{character}.correct'] = history.get('correct', 0)
+        history_max[f'answer_history.{character}.total'] = history.get('total', 0)
+    if history_max:
+        requests.append(UpdateOne({'_id': session_id}, {'$max': history_max}))
+
+    updates = {'updated_at': now, 'is_finished': is_finished}
+    for field, value in legacy.items():
+        updates[field] = {'$literal': value}
+    if is_finished or legacy:
+        # Процент считается на сервере уже после применения событий
+        requests.append(UpdateOne({'_id': session_id}, [
+            {'$set': updates},
+            {'$set': {'percentage': {'$cond': [
+                {'$gt': ['$total_answers', 0]},
+                {'$multiply': [{'$divide': ['$correct_answers', '$total_answers']}, 100]},
+                0.0,
+            ]}}},
+        ]))
+    return requests
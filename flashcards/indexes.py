@@ -0,0 +1,96 @@
+"""Индексы MongoDB под горячие запросы представлений."""
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from . import scheduler, word_stats
+
+INDEXES = {
+    'flashcards_gamesession': [
+        # game: активная сессия пользователя по категории
+        ([('user_id', ASCENDING), ('category', ASCENDING), ('is_finished', ASCENDING)], {}),
+        # home, stats: все сессии пользователя ($match по user_id перед $facet/$group)
+        # и история постранично, от новых к старым
+        ([('user_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)], {}),
+    ],
+    'flashcards_card': [
+        # create_collection: карточки пользователя по категории
+        ([('user_id', ASCENDING), ('category', ASCENDING)], {}),
+    ],
+    word_stats.WORD_STATS: word_stats.INDEXES,
+    scheduler.SRS_REVIEWS: scheduler.INDEXES,
+}
+
+# Горячие запросы для explain: (название, коллекция, фильтр, сортировка)
+HOT_QUERIES = [
+    ('game: active session', 'flashcards_gamesession',
+     {'user_id': 0, 'category': 'HSK1', 'is_finished': False, 'mode': {'$exists': False}}, None),
+    ('home: sessions of user', 'flashcards_gamesession', {'user_id': 0}, None),
+    ('stats_chart: sessions of user', 'flashcards_gamesession',
+     {'user_id': 0, 'mode': {'$exists': False}}, None),
+    ('stats: session history page', 'flashcards_gamesession',
+     {'user_id': 0}, [('created_at', DESCENDING), ('_id', DESCENDING)]),
+    ('create_collection: cards by category', 'flashcards_card',
+     {'user_id': 0, 'category': 'HSK1'}, None),
+    ('home: weak words', word_stats.WORD_STATS,
+     {'user_id': 0, 'accuracy': {'$lt': word_stats.WEAK_THRESHOLD}}, [('accuracy', ASCENDING)]),
+    ('game: due reviews', scheduler.SRS_REVIEWS,
+     {'user_id': 0, 'category': 'HSK1', 'due_at': {'$lte': 0}}, [('due_at', ASCENDING)]),
+]
+
+
+def index_name(keys):
+    """Имя индекса по умолчанию, как его формирует MongoDB."""
+    return '_'.join(f'{field}_{direction}' for field, direction in keys)
+
+
+def ensure_indexes(db, create=True):
+    """Создаёт недостающие индексы. Возвращает список (коллекция, имя, статус)."""
+    report = []
+    for collection_name, indexes in INDEXES.items():
+        collection = db[collection_name]
+        existing = {index['name'] for index in collection.list_indexes()}
+        missing = []
+        for keys, options in indexes:
+            name = options.get('name') or index_name(keys)
+            if name in existing:
+                report.append((collection_name, name, 'exists'))
+            else:
+                missing.append(IndexModel(keys, name=name, **{k: v for k, v in options.items() if k != 'name'}))
+                report.append((collection_name, name, 'created' if create else 'missing'))
+        if missing and create:
+            collection.create_indexes(missing)
+    return report
+
+
+def _plan_stages(plan):
+    stages = []
+    while plan:
+        stages.append(plan.get('stage'))
+        if 'inputStage' in plan:
+            plan = plan['inputStage']
+        elif plan.get('inputStages'):
+            for child in plan['inputStages']:
+                stages.extend(_plan_stages(child))
+            break
+        else:
+            break
+    return stages
+
+
+def explain_hot_queries(db):
+    """План выполнения каждого горячего запроса: стадии и используемый индекс."""
+    results = []
+    for title, collection_name, query, sort in HOT_QUERIES:
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain().get('queryPlanner', {}).get('winningPlan', {})
+        # Движок SBE (MongoDB 5.1+) вкладывает классический план в queryPlan
+        plan = plan.get('queryPlan', plan)
+        stages = _plan_stages(plan)
+        results.append({
+            'query': title,
+            'collection': collection_name,
+            'stages': stages,
+            'uses_index': 'IXSCAN' in stages and 'COLLSCAN' not in stages,
+        })
+    return results
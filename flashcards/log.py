@@ -0,0 +1,107 @@
+"""Логирование: идентификатор запроса, выборка отладочных записей и запись в фоне.
+
+Идентификатор запроса хранится в contextvar и проставляется в каждую
+запись, так что строки одного запроса легко собрать вместе. Отладочные
+записи пропускаются только для доли запросов (решение принимается по
+идентификатору, поэтому запрос попадает в выборку целиком). Сама запись в
+поток вывода идёт в отдельном потоке, а не на пути запроса.
+"""
+import atexit
+import contextlib
+import contextvars
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import uuid
+import zlib
+
+from .middleware import HybridMiddleware
+
+request_id = contextvars.ContextVar('request_id', default='-')
+
+REQUEST_ID_HEADER = 'HTTP_X_REQUEST_ID'
+_VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает DEBUG-записи только для доли rate запросов; остальные уровни — всегда."""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.threshold = int(max(0.0, min(float(rate), 1.0)) * 10000)
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        # Стабильный хеш: все записи одного запроса либо проходят, либо нет
+        return zlib.crc32(request_id.get().encode()) % 10000 < self.threshold
+
+
+class BackgroundStreamHandler(logging.handlers.QueueHandler):
+    """Форматирует запись в потоке запроса, а пишет в stream из фонового потока.
+
+    Поток-писатель запускается лениво и заново после fork: у воркера gunicorn
+    с --preload нет потоков родителя.
+    """
+
+    def __init__(self, stream=None):
+        super().__init__(queue.SimpleQueue())
+        self.stream = stream or sys.stderr
+        self._listener = None
+        self._pid = None
+
+    def _ensure_listener(self):
+        if self._pid == os.getpid():
+            return
+        self.queue = queue.SimpleQueue()
+        target = logging.StreamHandler(self.stream)
+        self._listener = logging.handlers.QueueListener(self.queue, target)
+        self._listener.start()
+        self._pid = os.getpid()
+        atexit.register(self._stop_listener)
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        super().enqueue(record)
+
+    def _stop_listener(self):
+        # Дописывает очередь до конца; в потомке после fork чужой поток не трогаем
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+        self._listener = None
+        self._pid = None
+
+    def close(self):
+        self._stop_listener()
+        super().close()
+
+
+def _request_id_from(request):
+    incoming = request.META.get(REQUEST_ID_HEADER, '')
+    return incoming if _VALID_REQUEST_ID.match(incoming) else uuid.uuid4().hex
+
+
+class RequestIdMiddleware(HybridMiddleware):
+    """Назначает запросу идентификатор: из X-Request-ID прокси или новый; возвращает его в ответе."""
+
+    @contextlib.contextmanager
+    def scope(self, request):
+        request.request_id = _request_id_from(request)
+        token = request_id.set(request.request_id)
+        try:
+            yield
+        finally:
+            request_id.reset(token)
+
+    def finish(self, request, response):
+        response['X-Request-ID'] = request.request_id
+        return response
@@ -0,0 +1,72 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+
+from flashcards import vocabulary
+from flashcards.indexes import ensure_indexes
+from flashcards.mongo import get_db
+from flashcards.session_codecs import SCHEMA_COMPACT, CompactSession
+from flashcards.word_stats import WORD_STATS, backfill_pipeline
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает коллекцию word_stats по answer_history сохранённых игровых сессий'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user-id', type=int, help='Пересчитать только одного пользователя')
+
+    def handle(self, *args, **options):
+        db = get_db()
+        ensure_indexes(db)
+        now = datetime.datetime.now()
+        rows = db['flashcards_gamesession'].aggregate(
+            backfill_pipeline(options['user_id']), allowDiskUse=True
+        )
+        totals = {}
+        for row in rows:
+            key = row['_id']
+            totals[(key['user_id'], key['category'], key['character'])] = (row['correct'], row['total'])
+        self._add_compact(db, options['user_id'], totals)
+
+        written = 0
+        batch = []
+        for (user_id, category, character), (correct, total) in totals.items():
+            # $set, а не $inc: повторный запуск даёт тот же результат
+            key = {'user_id': user_id, 'category': category, 'character': character}
+            batch.append(UpdateOne(key, {'$set': {
+                'correct': correct,
+                'total': total,
+                'accuracy': correct / total if total > 0 else None,
+                'updated_at': now,
+            }}, upsert=True))
+            if len(batch) >= BATCH_SIZE:
+                db[WORD_STATS].bulk_write(batch, ordered=False)
+                written += len(batch)
+                batch = []
+        if batch:
+            db[WORD_STATS].bulk_write(batch, ordered=False)
+            written += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'word_stats updated: {written} documents'))
+
+    def _add_compact(self, db, user_id, totals):
+        """Добавляет к totals историю сессий в компактной схеме.
+
+        Упакованные счётчики не разобрать агрегацией, поэтому они
+        распаковываются здесь.
+        """
+        query = {'schema': SCHEMA_COMPACT, 'category': {'$in': list(vocabulary.LEVELS)}}
+        if user_id is not None:
+            query['user_id'] = user_id
+        sessions = db['flashcards_gamesession'].find(
+            query, {'user_id': 1, 'category': 1, 'history_correct': 1, 'history_total': 1}
+        )
+        for session in sessions:
+            state = CompactSession.from_document(session)
+            for character, history in state.answer_history().items():
+                key = (session['user_id'], session['category'], character)
+                correct, total = totals.get(key, (0, 0))
+                totals[key] = (correct + history['correct'], total + history['total'])
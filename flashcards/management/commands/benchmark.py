@@ -0,0 +1,352 @@
+import contextlib
+import datetime
+import io
+import json
+import math
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from unittest import mock
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from pymongo import monitoring
+
+from flashcards import mongo, page_cache, vocabulary
+from flashcards.game_sessions import GAME_SESSIONS, compact_enabled, find_session
+from flashcards.models import Card, Collection
+from flashcards.session_codecs import SCHEMA_COMPACT, CompactSession
+from flashcards.testing import create_tables, mongomock_date_add, use_database
+from flashcards.word_stats import WORD_STATS
+
+SEARCH_QUERIES = ['ai', 'ni', 'hao', 'xue', 'shi', 'love', 'to', 'big', 'zhongguo', 'water']
+EVENTS_PER_BATCH = 5
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Считает команды MongoDB по имени между reset() и snapshot().
+
+    pymongo не позволяет снять зарегистрированный слушатель, поэтому вне
+    замеров счётчик просто выключен (active = False).
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.active = False
+
+    def reset(self):
+        self.counts = {}
+
+    def add(self, name):
+        if self.active:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def snapshot(self):
+        return dict(self.counts)
+
+    def started(self, event):
+        self.add(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+@contextlib.contextmanager
+def _count_mongomock_calls(mongomock, counter):
+    # mongomock не отправляет событий мониторинга: считаем вызовы методов коллекции
+    methods = [
+        'find', 'find_one', 'aggregate', 'count_documents', 'distinct',
+        'insert_one', 'insert_many', 'update_one', 'update_many', 'replace_one',
+        'delete_one', 'delete_many', 'find_one_and_update', 'bulk_write',
+    ]
+    with contextlib.ExitStack() as stack:
+        for name in methods:
+            original = getattr(mongomock.collection.Collection, name)
+
+            def counted(self, *args, _original=original, _name=name, **kwargs):
+                counter.add(_name)
+                return _original(self, *args, **kwargs)
+
+            stack.enter_context(mock.patch.object(mongomock.collection.Collection, name, counted))
+        yield
+
+
+def _percentile(values, percent):
+    # Метод ближайшего ранга
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Замеряет горячие страницы (home, stats, collections, game, end_game, поиск) на синтетических данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mongomock', action='store_true', help='Запускать на mongomock вместо mongod')
+        parser.add_argument('--mongo-uri', default='mongodb://localhost:27017', help='Локальный mongod для замеров')
+        parser.add_argument('--db-name', default='srs_bench', help='База для замеров, пересоздаётся при каждом запуске')
+        parser.add_argument('--force', action='store_true', help='Разрешить базу без суффикса _bench')
+        parser.add_argument('--users', type=int, default=3)
+        parser.add_argument('--cards', type=int, default=100, help='Карточек на пользователя')
+        parser.add_argument('--collections', type=int, default=10, help='Подборок на пользователя')
+        parser.add_argument('--sessions', type=int, default=50, help='Завершённых сессий на пользователя')
+        parser.add_argument('--iterations', type=int, default=50, help='Замеров на каждую страницу')
+        parser.add_argument('--warmup', type=int, default=5, help='Прогревочных запросов перед замерами')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help='Файл для результатов в JSON')
+
+    def handle(self, *args, **options):
+        if not options['db_name'].endswith('_bench') and not options['force']:
+            raise CommandError(
+                f'База {options["db_name"]} будет удалена и заполнена заново. '
+                'Используйте имя с суффиксом _bench или --force.'
+            )
+        self.random = random.Random(options['seed'])
+        self.counter = CommandCounter()
+
+        # Подмены клиентов и mongomock действуют только на время замеров
+        with contextlib.ExitStack() as stack:
+            self._connect(stack, options)
+            # Файловые сессии клиентов замеров пишутся во временный каталог, а не в SESSION_FILE_PATH
+            stack.enter_context(override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                SESSION_FILE_PATH=stack.enter_context(tempfile.TemporaryDirectory()),
+            ))
+            stack.callback(setattr, self.counter, 'active', False)
+            self.counter.active = True
+            db = mongo.get_db()
+            users = self._seed(db, options)
+            results = self._run(db, users, options)
+
+        report = {
+            'meta': {
+                'revision': _git_revision(),
+                'started_at': datetime.datetime.now().isoformat(timespec='seconds'),
+                'backend': 'mongomock' if options['mongomock'] else 'mongod',
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'session_schema': settings.GAME_SESSION_SCHEMA,
+                'params': {key: options[key] for key in (
+                    'users', 'cards', 'collections', 'sessions', 'iterations', 'warmup', 'seed',
+                )},
+            },
+            'results': results,
+        }
+        self._print(results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+
+    def _connect(self, stack, options):
+        # Оба клиента — djongo и flashcards.mongo — создаются заново уже после
+        # подмены адреса и регистрации счётчика команд
+        if options['mongomock']:
+            try:
+                import mongomock
+            except ImportError:
+                raise CommandError('Для --mongomock нужен пакет mongomock')
+            stack.enter_context(use_database(options['db_name'], client=mongomock.MongoClient()))
+            stack.enter_context(_count_mongomock_calls(mongomock, self.counter))
+            stack.enter_context(mongomock_date_add(mongomock))
+        else:
+            monitoring.register(self.counter)
+            stack.enter_context(use_database(options['db_name'], host=options['mongo_uri']))
+
+    def _seed(self, db, options):
+        db.client.drop_database(options['db_name'])
+        create_tables(db)
+
+        now = datetime.datetime.now()
+        users = []
+        for number in range(options['users']):
+            user = User.objects.create_user(f'bench{number}', password='bench')
+            words = [self.random.choice(vocabulary.all_words()) for _ in range(options['cards'])]
+            Card.objects.bulk_create([
+                Card(user=user, character=word.character, pinyin=word.pinyin, meaning=word.meaning, category=word.level)
+                for word in words
+            ])
+            card_ids = [str(card['_id']) for card in db['flashcards_card'].find({'user_id': user.id}, {'_id': 1})]
+            for index in range(options['collections']):
+                Collection.objects.create(
+                    user=user,
+                    name=f'Подборка {index}',
+                    category=self.random.choice(vocabulary.LEVELS),
+                    cards=self.random.sample(card_ids, min(20, len(card_ids))),
+                )
+            totals = {}
+            sessions = []
+            for index in range(options['sessions']):
+                session, history = self._session(user.id, now - datetime.timedelta(hours=index))
+                sessions.append(session)
+                for character, counters in history.items():
+                    correct, total = totals.get((session['category'], character), (0, 0))
+                    totals[(session['category'], character)] = (correct + counters['correct'], total + counters['total'])
+            if sessions:
+                db[GAME_SESSIONS].insert_many(sessions)
+            # word_stats — сразу итогами, как после backfill_word_stats
+            if totals:
+                db[WORD_STATS].insert_many([
+                    {
+                        'user_id': user.id, 'category': category, 'character': character,
+                        'correct': correct, 'total': total, 'accuracy': correct / total, 'updated_at': now,
+                    }
+                    for (category, character), (correct, total) in totals.items()
+                ])
+            users.append(user)
+        return users
+
+    def _session(self, user_id, created_at):
+        """Завершённая сессия со случайными ответами и её answer_history."""
+        category = self.random.choice(vocabulary.LEVELS)
+        state = CompactSession.new(category)
+        answered = self.random.randint(1, vocabulary.level_size(category))
+        correct_answers = 0
+        for word in self.random.sample(vocabulary.level_words(category), answered):
+            correct = self.random.random() < 0.7
+            state.answer(word.character, correct)
+            correct_answers += correct
+        history = state.answer_history()
+        if compact_enabled():
+            cards = {'schema': SCHEMA_COMPACT, 'rev': 0, **state.to_fields()}
+        else:
+            cards = {'remaining_cards': state.remaining_cards(), 'answer_history': history}
+        return {
+            'user_id': user_id,
+            'category': category,
+            **cards,
+            'correct_answers': correct_answers,
+            'total_answers': answered,
+            'percentage': correct_answers / answered * 100,
+            'last_seq': 0,
+            'is_finished': True,
+            'created_at': created_at,
+            'updated_at': created_at,
+        }, history
+
+    def _run(self, db, users, options):
+        clients = []
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            clients.append((user, client))
+        game_state = {}
+
+        def end_game(user, client):
+            # Пачка ответов на ещё не отвеченные карточки активной сессии HSK3
+            state = game_state.get(user.id)
+            if state is None or len(state['remaining']) < EVENTS_PER_BATCH:
+                if state is not None:
+                    client.post(state['url'], json.dumps({'events': [], 'is_finished': True}),
+                                content_type='application/json')
+                client.get('/game/HSK3/')
+                session = find_session(db, user.id, 'HSK3')
+                state = game_state[user.id] = {
+                    'url': f'/game/end/{session["_id"]}/',
+                    'remaining': list(session['remaining_cards']),
+                    'seq': session.get('last_seq', 0),
+                }
+            events = []
+            for _ in range(EVENTS_PER_BATCH):
+                state['seq'] += 1
+                events.append({
+                    'seq': state['seq'],
+                    'character': state['remaining'].pop(),
+                    'correct': self.random.random() < 0.7,
+                })
+            return client.post(state['url'], json.dumps({'events': events}), content_type='application/json')
+
+        def search(user, client):
+            query = self.random.choice(SEARCH_QUERIES)
+            return client.post('/dictionary/search/', json.dumps({'query': query}), content_type='application/json')
+
+        def uncached(path):
+            def request(user, client):
+                # Новая версия кеша дашбордов: страница собирается заново
+                page_cache.bump_version(user.id)
+                return client.get(path)
+            return request
+
+        scenarios = [
+            ('home', lambda user, client: client.get('/')),
+            ('home_uncached', uncached('/')),
+            ('stats', lambda user, client: client.get('/stats/')),
+            ('stats_uncached', uncached('/stats/')),
+            ('collections', lambda user, client: client.get('/collections/')),
+            ('game', lambda user, client: client.get('/game/HSK1/')),
+            ('end_game', end_game),
+            ('dictionary_search', search),
+        ]
+
+        results = {}
+        for name, request in scenarios:
+            with contextlib.redirect_stdout(io.StringIO()):
+                for index in range(options['warmup']):
+                    request(*clients[index % len(clients)])
+
+                timings = []
+                commands = {}
+                for index in range(options['iterations']):
+                    user, client = clients[index % len(clients)]
+                    self.counter.reset()
+                    started = time.perf_counter()
+                    response = request(user, client)
+                    timings.append((time.perf_counter() - started) * 1000)
+                    if response.status_code >= 400:
+                        raise CommandError(f'{name}: HTTP {response.status_code}')
+                    for command, count in self.counter.snapshot().items():
+                        commands[command] = commands.get(command, 0) + count
+
+                # Память — отдельным проходом: tracemalloc сам заметно замедляет запросы
+                tracemalloc.start()
+                peaks = []
+                allocated = []
+                for index in range(min(options['iterations'], 10)):
+                    tracemalloc.reset_peak()
+                    before = tracemalloc.get_traced_memory()[0]
+                    request(*clients[index % len(clients)])
+                    current, peak = tracemalloc.get_traced_memory()
+                    peaks.append(peak - before)
+                    allocated.append(current - before)
+                tracemalloc.stop()
+
+            iterations = len(timings)
+            results[name] = {
+                'iterations': iterations,
+                'p50_ms': round(_percentile(timings, 50), 3),
+                'p95_ms': round(_percentile(timings, 95), 3),
+                'mean_ms': round(statistics.mean(timings), 3),
+                'max_ms': round(max(timings), 3),
+                'mongo_commands_per_request': round(sum(commands.values()) / iterations, 2),
+                'mongo_commands': {command: round(count / iterations, 2) for command, count in sorted(commands.items())},
+                'peak_kb': round(_percentile(peaks, 50) / 1024, 1),
+                'retained_kb': round(_percentile(allocated, 50) / 1024, 1),
+            }
+        return results
+
+    def _print(self, results):
+        self.stdout.write(f'{"page":<18}{"p50 ms":>10}{"p95 ms":>10}{"mongo/req":>11}{"peak KB":>10}')
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<18}{result["p50_ms"]:>10.2f}{result["p95_ms"]:>10.2f}'
+                f'{result["mongo_commands_per_request"]:>11.2f}{result["peak_kb"]:>10.1f}'
+            )
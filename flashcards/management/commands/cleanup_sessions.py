@@ -0,0 +1,39 @@
+import time
+from importlib import import_module
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Удаляет истёкшие сессии текущего хранилища и старые файлы сессий'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--legacy-files', action='store_true',
+                            help='Удалить истёкшие файлы сессий из SESSION_FILE_PATH после смены хранилища')
+
+    def handle(self, *args, **options):
+        if settings.SESSION_MODE in ('signed_cookies', 'cache'):
+            # Срок жизни контролирует сама cookie или TIMEOUT кеша
+            self.stdout.write(f'Session mode {settings.SESSION_MODE} expires sessions by itself')
+        else:
+            engine = import_module(settings.SESSION_ENGINE)
+            engine.SessionStore.clear_expired()
+            self.stdout.write(self.style.SUCCESS(f'Expired sessions cleared ({settings.SESSION_MODE})'))
+
+        if options['legacy_files'] and settings.SESSION_MODE != 'file':
+            self.stdout.write(f'Legacy session files removed: {self._remove_legacy_files()}')
+
+    def _remove_legacy_files(self):
+        storage_path = Path(settings.SESSION_FILE_PATH)
+        if not storage_path.is_dir():
+            return 0
+        prefix = settings.SESSION_COOKIE_NAME
+        expired_before = time.time() - settings.SESSION_COOKIE_AGE
+        removed = 0
+        for path in storage_path.glob(f'{prefix}*'):
+            if path.is_file() and path.stat().st_mtime < expired_before:
+                path.unlink()
+                removed += 1
+        return removed
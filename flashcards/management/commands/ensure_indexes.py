@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from flashcards.indexes import ensure_indexes, explain_hot_queries
+from flashcards.mongo import get_db
+
+
+class Command(BaseCommand):
+    help = 'Создаёт составные индексы MongoDB для горячих запросов и показывает их планы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только показать недостающие индексы')
+        parser.add_argument('--explain', action='store_true', help='Вывести план каждого горячего запроса')
+
+    def handle(self, *args, **options):
+        db = get_db()
+        for collection, name, status in ensure_indexes(db, create=not options['dry_run']):
+            style = self.style.SUCCESS if status != 'missing' else self.style.WARNING
+            self.stdout.write(style(f'{collection}.{name}: {status}'))
+
+        if options['explain']:
+            for result in explain_hot_queries(db):
+                style = self.style.SUCCESS if result['uses_index'] else self.style.ERROR
+                stages = ' <- '.join(stage for stage in result['stages'] if stage)
+                self.stdout.write(style(f"{result['query']} ({result['collection']}): {stages}"))
@@ -0,0 +1,72 @@
+import bson
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+
+from flashcards import vocabulary
+from flashcards.game_sessions import GAME_SESSIONS
+from flashcards.mongo import get_db
+from flashcards.session_codecs import COMPACT_FIELDS, LEGACY_FIELDS, SCHEMA_COMPACT, CompactSession
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Переводит игровые сессии между старой и компактной схемой хранения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--to', choices=['compact', 'legacy'], default='compact', help='Целевая схема')
+        parser.add_argument('--user-id', type=int, help='Перевести только сессии одного пользователя')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать сессии и размер полей')
+
+    def handle(self, *args, **options):
+        db = get_db()
+        collection = db[GAME_SESSIONS]
+        to_compact = options['to'] == 'compact'
+        query = {'schema': {'$ne': SCHEMA_COMPACT}} if to_compact else {'schema': SCHEMA_COMPACT}
+        query['category'] = {'$in': list(vocabulary.LEVELS)}
+        if options['user_id'] is not None:
+            query['user_id'] = options['user_id']
+        source_fields = LEGACY_FIELDS if to_compact else COMPACT_FIELDS
+        projection = {field: 1 for field in source_fields + ('category', 'rev', 'total_answers', 'updated_at')}
+
+        converted = skipped = 0
+        size_before = size_after = 0
+        batch = []
+        for session in collection.find(query, projection):
+            if to_compact:
+                fields = CompactSession.from_legacy(session).to_fields()
+                update = {
+                    '$set': {'schema': SCHEMA_COMPACT, 'rev': 0, **fields},
+                    '$unset': {field: '' for field in LEGACY_FIELDS},
+                }
+                # Старые сессии обновляются атомарными $inc: конвертируем, только если
+                # с момента чтения не было ни одного ответа
+                guard = {'total_answers': session.get('total_answers', 0), 'updated_at': session.get('updated_at')}
+                size_before += len(bson.encode({field: session.get(field) for field in LEGACY_FIELDS}))
+                size_after += len(bson.encode(fields))
+            else:
+                state = CompactSession.from_document(session)
+                update = {
+                    '$set': {'remaining_cards': state.remaining_cards(), 'answer_history': state.answer_history()},
+                    '$unset': {field: '' for field in COMPACT_FIELDS + ('schema', 'rev')},
+                }
+                guard = {'rev': session['rev'] if 'rev' in session else {'$exists': False}}
+            batch.append(UpdateOne({'_id': session['_id'], **guard}, update))
+            if len(batch) >= BATCH_SIZE:
+                converted, skipped = self._flush(collection, batch, converted, skipped, options['dry_run'])
+                batch = []
+        if batch:
+            converted, skipped = self._flush(collection, batch, converted, skipped, options['dry_run'])
+
+        verb = 'would convert' if options['dry_run'] else 'converted'
+        self.stdout.write(self.style.SUCCESS(f'Sessions {verb} to {options["to"]}: {converted}'))
+        if skipped:
+            self.stdout.write(self.style.WARNING(f'Skipped (changed during migration, run again): {skipped}'))
+        if to_compact and converted:
+            self.stdout.write(f'BSON size of card fields: {size_before} -> {size_after} bytes')
+
+    def _flush(self, collection, batch, converted, skipped, dry_run):
+        if dry_run:
+            return converted + len(batch), skipped
+        result = collection.bulk_write(batch, ordered=False)
+        return converted + result.modified_count, skipped + len(batch) - result.matched_count
@@ -0,0 +1,245 @@
+"""Метрики процесса в текстовом формате Prometheus для /metrics.
+
+Небольшой собственный реестр без внешних зависимостей: счётчики и
+гистограммы с метками, значения в памяти процесса. Каждый воркер gunicorn
+отдаёт свои метрики, поэтому Prometheus должен опрашивать воркеры по
+отдельности или суммировать ряды по instance.
+
+Собираются: время и размеры запросов по представлениям, команды MongoDB
+(из command_metrics), время загрузки и сохранения сессий, состояние пула
+соединений и доли попаданий внутренних кешей.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.contrib.sessions.middleware import SessionMiddleware
+
+from .middleware import HybridMiddleware
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield self.name, _labels(self.label_names, labels), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def samples(self):
+        with self._lock:
+            values = {labels: ([*series[0]], series[1], series[2]) for labels, series in self._values.items()}
+        for labels, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket', _labels(self.label_names, labels, [('le', _number(bound))]), cumulative
+            yield f'{self.name}_bucket', _labels(self.label_names, labels, [('le', '+Inf')]), count
+            yield f'{self.name}_sum', _labels(self.label_names, labels), total
+            yield f'{self.name}_count', _labels(self.label_names, labels), count
+
+
+class Gauge:
+    """Значения считываются при каждой выдаче метрик функцией collect() -> {labels: value}."""
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, collect, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.collect = collect
+
+    def samples(self):
+        for labels, value in sorted(self.collect().items()):
+            yield self.name, _labels(self.label_names, labels), value
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+request_duration = registry.register(Histogram(
+    'flashcards_request_duration_seconds', 'Время обработки запроса по представлениям', ['view', 'method'],
+))
+requests_total = registry.register(Counter(
+    'flashcards_requests_total', 'Запросы по представлениям и кодам ответа', ['view', 'method', 'status'],
+))
+request_size = registry.register(Histogram(
+    'flashcards_request_size_bytes', 'Размер тела запроса', ['view'], buckets=SIZE_BUCKETS,
+))
+response_size = registry.register(Histogram(
+    'flashcards_response_size_bytes', 'Размер тела ответа', ['view'], buckets=SIZE_BUCKETS,
+))
+mongo_commands = registry.register(Counter(
+    'flashcards_mongo_commands_total', 'Команды MongoDB по имени', ['command'],
+))
+mongo_command_duration = registry.register(Histogram(
+    'flashcards_mongo_command_duration_seconds', 'Время выполнения команд MongoDB', ['command'],
+))
+mongo_request_commands = registry.register(Histogram(
+    'flashcards_mongo_commands_per_request', 'Число команд MongoDB на запрос', ['view'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34),
+))
+session_duration = registry.register(Histogram(
+    'flashcards_session_operation_seconds', 'Загрузка и сохранение сессий', ['backend', 'operation'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+))
+
+
+def _pool_gauges():
+    from .mongo import pool_stats
+    snapshot = pool_stats.snapshot()
+    return {(key,): value for key, value in snapshot.items()}
+
+
+def _cache_gauges():
+    from .auth_backends import user_cache
+    from .page_cache import counters
+    values = {}
+    for cache, stats in (('user', user_cache.stats()), ('dashboard', counters.stats())):
+        values[(cache, 'hits')] = stats['hits']
+        values[(cache, 'misses')] = stats['misses']
+        values[(cache, 'hit_ratio')] = stats['hit_rate']
+    return values
+
+
+registry.register(Gauge('flashcards_mongo_pool', 'Состояние пула соединений MongoDB', _pool_gauges, ['stat']))
+registry.register(Gauge('flashcards_cache', 'Попадания и промахи внутренних кешей', _cache_gauges, ['cache', 'stat']))
+
+
+def observe_command(command_name, duration_seconds):
+    mongo_commands.inc(command_name)
+    mongo_command_duration.observe(duration_seconds, command_name)
+
+
+class MetricsMiddleware(HybridMiddleware):
+    """Время, размеры и команды MongoDB запроса с меткой по имени маршрута."""
+
+    @contextmanager
+    def scope(self, request):
+        request.metrics_started = time.perf_counter()
+        yield
+
+    def finish(self, request, response):
+        elapsed = time.perf_counter() - request.metrics_started
+        match = getattr(request, 'resolver_match', None)
+        # Имена маршрутов конечны, поэтому метка не разрастается от произвольных URL
+        view = match.url_name if match and match.url_name else 'unmatched'
+        request_duration.observe(elapsed, view, request.method)
+        requests_total.inc(view, request.method, str(response.status_code))
+        try:
+            request_size.observe(int(request.META.get('CONTENT_LENGTH') or 0), view)
+        except ValueError:
+            pass
+        if not response.streaming:
+            response_size.observe(len(response.content), view)
+        stats = getattr(request, 'mongo_stats', None)
+        if stats is not None:
+            mongo_request_commands.observe(stats.commands, view)
+        return response
+
+
+def _timed_store(store_class):
+    backend = store_class.__module__.rsplit('.', 1)[-1]
+
+    class TimedSessionStore(store_class):
+        def load(self):
+            with session_duration.time(backend, 'load'):
+                return super().load()
+
+        def save(self, must_create=False):
+            with session_duration.time(backend, 'save'):
+                return super().save(must_create)
+
+    # Соль подписи сессии строится из __qualname__ класса хранилища: без этого
+    # сессии, сохранённые исходным SessionStore, не читались бы через middleware
+    TimedSessionStore.__name__ = store_class.__name__
+    TimedSessionStore.__qualname__ = store_class.__qualname__
+    return TimedSessionStore
+
+
+class TimedSessionMiddleware(SessionMiddleware):
+    """SessionMiddleware, который замеряет загрузку и сохранение сессии выбранного бэкенда."""
+
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        self.SessionStore = _timed_store(self.SessionStore)
@@ -0,0 +1,45 @@
+"""Основа собственных middleware, работающих и под WSGI, и под ASGI.
+
+Если хотя бы одно middleware в цепочке только синхронное, Django под ASGI
+выполняет запрос в потоке и асинхронные представления теряют смысл. Здесь
+подкласс описывает обработку один раз, а базовый класс вызывает её из
+синхронной или асинхронной цепочки — в зависимости от того, что передал Django.
+"""
+import contextlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+
+class HybridMiddleware:
+    """Подкласс переопределяет scope(request) и/или finish(request, response).
+
+    scope — контекстный менеджер вокруг вызова представления (выход из него
+    выполняется и при исключении), finish — обработка готового ответа.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            # Так Django распознаёт экземпляр как асинхронный (как в MiddlewareMixin)
+            markcoroutinefunction(self)
+
+    def scope(self, request):
+        return contextlib.nullcontext()
+
+    def finish(self, request, response):
+        return response
+
+    def __call__(self, request):
+        if self.is_async:
+            return self._acall(request)
+        with self.scope(request):
+            response = self.get_response(request)
+        return self.finish(request, response)
+
+    async def _acall(self, request):
+        with self.scope(request):
+            response = await self.get_response(request)
+        return self.finish(request, response)
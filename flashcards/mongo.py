@@ -0,0 +1,196 @@
+"""Общий пул подключений к MongoDB для всех представлений.
+
+Клиент создаётся лениво, один на процесс: после fork (воркеры gunicorn)
+процесс-потомок заводит собственный клиент и не использует сокеты родителя.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from pymongo import MongoClient, monitoring
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_client = None
+_client_pid = None
+_async_client = None
+_async_loop = None
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Считает выдачи соединений из пула и время ожидания свободного соединения."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.checked_out = 0
+            self.connections_created = 0
+            self.connections_closed = 0
+            self.wait_time_total = 0.0
+            self.wait_time_max = 0.0
+
+    def snapshot(self):
+        with self._lock:
+            avg_wait = self.wait_time_total / self.checkouts if self.checkouts else 0.0
+            return {
+                'checkouts': self.checkouts,
+                'checkout_failures': self.checkout_failures,
+                'checked_out': self.checked_out,
+                'connections_created': self.connections_created,
+                'connections_closed': self.connections_closed,
+                'wait_time_total_ms': round(self.wait_time_total * 1000, 3),
+                'wait_time_avg_ms': round(avg_wait * 1000, 3),
+                'wait_time_max_ms': round(self.wait_time_max * 1000, 3),
+            }
+
+    def connection_check_out_started(self, event):
+        # Выдача соединения происходит в том же потоке, что и запрос
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        started = getattr(self._local, 'started', None)
+        waited = time.perf_counter() - started if started is not None else 0.0
+        self._local.started = None
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.wait_time_total += waited
+            self.wait_time_max = max(self.wait_time_max, waited)
+
+    def connection_check_out_failed(self, event):
+        self._local.started = None
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(self.checked_out - 1, 0)
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_closed += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+
+pool_stats = PoolStatsListener()
+
+
+def _client_options():
+    return {
+        'maxPoolSize': settings.MONGO_MAX_POOL_SIZE,
+        'minPoolSize': settings.MONGO_MIN_POOL_SIZE,
+        'maxIdleTimeMS': settings.MONGO_MAX_IDLE_TIME_MS,
+        'waitQueueTimeoutMS': settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        'serverSelectionTimeoutMS': settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        'event_listeners': [pool_stats],
+    }
+
+
+def get_client():
+    """Возвращает общий MongoClient текущего процесса, создавая его при первом обращении."""
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+    with _lock:
+        if _client is None or _client_pid != pid:
+            # Клиент, унаследованный от родителя после fork, не закрываем:
+            # его сокеты принадлежат родительскому процессу.
+            _client = MongoClient(settings.MONGO_URI, **_client_options())
+            _client_pid = pid
+            pool_stats.reset()
+            if settings.MONGO_ENSURE_INDEXES:
+                _verify_indexes(_client[settings.MONGO_DB_NAME])
+    return _client
+
+
+def _verify_indexes(db):
+    # Выполняется при создании клиента в процессе, то есть на первом запросе воркера,
+    # который обращается к MongoDB, а не в AppConfig.ready(). Недостающие индексы
+    # создаются, ошибка не мешает работе; при развёртывании — manage.py ensure_indexes
+    from .indexes import ensure_indexes
+    try:
+        created = [f'{collection}.{name}' for collection, name, status in ensure_indexes(db) if status == 'created']
+        if created:
+            logger.info('Created MongoDB indexes: %s', ', '.join(created))
+    except Exception:
+        logger.exception('MongoDB index verification failed')
+
+
+def get_db():
+    return get_client()[settings.MONGO_DB_NAME]
+
+
+def get_async_db():
+    """База через motor для асинхронных представлений (flashcards/async_views.py).
+
+    motor импортируется лениво: синхронному развёртыванию пакет не нужен.
+    Клиент привязан к циклу событий, поэтому создаётся заново, если цикл
+    сменился (у uvicorn цикл один на процесс).
+    """
+    global _async_client, _async_loop
+    try:
+        from motor.motor_asyncio import AsyncIOMotorClient
+    except ImportError:
+        raise ImproperlyConfigured('Для ASYNC_VIEWS нужен пакет motor (requirements-async.txt)')
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_loop is not loop:
+        if _async_client is not None:
+            _async_client.close()
+        _async_client = AsyncIOMotorClient(settings.MONGO_URI, io_loop=loop, **_client_options())
+        _async_loop = loop
+    return _async_client[settings.MONGO_DB_NAME]
+
+
+def close_client():
+    global _client, _client_pid
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+
+def health():
+    """Пингует сервер и возвращает состояние пула соединений."""
+    started = time.perf_counter()
+    error = None
+    try:
+        get_client().admin.command('ping')
+    except Exception as e:
+        error = str(e)
+    result = {
+        'status': 'error' if error else 'ok',
+        'ping_ms': round((time.perf_counter() - started) * 1000, 3),
+        'pid': os.getpid(),
+        'pool': pool_stats.snapshot(),
+    }
+    if error:
+        result['error'] = error
+    return result
@@ -0,0 +1,86 @@
+"""Кеш данных дашбордов (home, stats) с версией на пользователя.
+
+Данные страницы кешируются под ключом (пользователь, версия). Версию
+меняют операции, меняющие статистику: сохранение ответов, завершение
+игры, создание карточки или сессии. Старые записи после этого просто
+не читаются и вытесняются по TTL.
+
+Версия хранится в MongoDB (документ на пользователя в DASHBOARD_VERSIONS),
+а не в кеше: кеш 'dashboard' по умолчанию локальный для процесса, и версия,
+сменённая одним воркером, иначе не была бы видна остальным. Сами данные
+страниц могут оставаться в локальном кеше — они ищутся по общей версии.
+"""
+import threading
+
+from bson import ObjectId
+from django.conf import settings
+from django.core.cache import caches
+from pymongo import ReturnDocument
+
+from .mongo import get_db
+
+CACHE_ALIAS = 'dashboard'
+DASHBOARD_VERSIONS = 'flashcards_dashboard_versions'
+
+
+class _Counters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+counters = _Counters()
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def version_bump(user_id):
+    """Фильтр и изменение для смены версии (для асинхронных представлений на motor)."""
+    # Новый ObjectId вместо $inc: версия не повторится, даже если документ удалят
+    return {'_id': user_id}, {'$set': {'version': ObjectId()}}
+
+
+def get_version(user_id):
+    versions = get_db()[DASHBOARD_VERSIONS]
+    doc = versions.find_one({'_id': user_id})
+    if doc is None:
+        doc = versions.find_one_and_update(
+            {'_id': user_id}, {'$setOnInsert': {'version': ObjectId()}},
+            upsert=True, return_document=ReturnDocument.AFTER,
+        )
+    return doc['version']
+
+
+def bump_version(user_id):
+    get_db()[DASHBOARD_VERSIONS].update_one(*version_bump(user_id), upsert=True)
+
+
+def get_or_build(user_id, name, builder, variant=''):
+    """Возвращает данные страницы name для пользователя, вызывая builder при промахе."""
+    cache = _cache()
+    key = f'dashboard:{name}:{user_id}:{get_version(user_id)}:{variant}'
+    data = cache.get(key)
+    counters.add(data is not None)
+    if data is None:
+        data = builder()
+        cache.set(key, data, timeout=settings.DASHBOARD_CACHE_TTL)
+    return data
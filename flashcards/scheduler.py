@@ -0,0 +1,140 @@
+"""Интервальное повторение по алгоритму SM-2.
+
+На каждую пару (пользователь, слово уровня) хранится документ в
+flashcards_srs_reviews: фактор лёгкости, текущий интервал в днях, число
+успешных повторений подряд и дата следующего показа due_at. Ответ
+пересчитывает их одной атомарной операцией-пайплайном, как word_stats.
+
+Колода режима повторения — слова с наступившим due_at (сначала самые
+просроченные) и, если места хватает, ещё не изученные слова уровня.
+"""
+import datetime
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from . import vocabulary
+from .word_stats import only_duplicate_upserts
+
+SRS_REVIEWS = 'flashcards_srs_reviews'
+
+INDEXES = [
+    ([('user_id', ASCENDING), ('category', ASCENDING), ('character', ASCENDING)], {'unique': True}),
+    # Очередь повторения: слова уровня по возрастанию due_at
+    ([('user_id', ASCENDING), ('category', ASCENDING), ('due_at', ASCENDING)], {}),
+]
+
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+# В игре ответ только верный или неверный: оценки SM-2 для них
+QUALITY_CORRECT = 4
+QUALITY_WRONG = 1
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+def _ease_delta(quality):
+    return 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)
+
+
+def review_update(correct, now, session_id=None):
+    """Пайплайн обновления документа повторения по одному ответу."""
+    quality = QUALITY_CORRECT if correct else QUALITY_WRONG
+    ease = {'$max': [MIN_EASE, {'$add': ['$ease', _ease_delta(quality)]}]}
+    if correct:
+        schedule = {
+            'interval': {'$switch': {
+                'branches': [
+                    {'case': {'$eq': ['$repetitions', 0]}, 'then': 1},
+                    {'case': {'$eq': ['$repetitions', 1]}, 'then': 6},
+                ],
+                # Дробный интервал округляется вверх, как в исходном SM-2
+                'default': {'$ceil': {'$multiply': ['$interval', '$ease']}},
+            }},
+            'repetitions': {'$add': ['$repetitions', 1]},
+            'ease': ease,
+        }
+    else:
+        schedule = {
+            'interval': 1,
+            'repetitions': 0,
+            'lapses': {'$add': ['$lapses', 1]},
+            'ease': ease,
+        }
+    finish = {
+        'due_at': {'$add': [now, {'$multiply': ['$interval', DAY_MS]}]},
+        'reviewed_at': now,
+    }
+    if session_id is not None:
+        finish['last_session_id'] = session_id
+    return [
+        {'$set': {
+            'ease': {'$ifNull': ['$ease', INITIAL_EASE]},
+            'interval': {'$ifNull': ['$interval', 0]},
+            'repetitions': {'$ifNull': ['$repetitions', 0]},
+            'lapses': {'$ifNull': ['$lapses', 0]},
+        }},
+        {'$set': schedule},
+        {'$set': finish},
+    ]
+
+
+def review_requests(user_id, category, answer_history, session_id=None, now=None):
+    """Операции bulk_write по ответам вида {character: {'correct', 'total'}}.
+
+    Слово считается отвеченным верно, если все его ответы верные. С session_id
+    запись идемпотентна так же, как в word_stats.answer_requests.
+    """
+    now = now or datetime.datetime.now()
+    requests = []
+    for character, history in answer_history.items():
+        total = history.get('total', 0)
+        if not total:
+            continue
+        query = {'user_id': user_id, 'category': category, 'character': character}
+        if session_id is not None:
+            query['last_session_id'] = {'$ne': session_id}
+        correct = history.get('correct', 0) >= total
+        requests.append(UpdateOne(query, review_update(correct, now, session_id), upsert=True))
+    return requests
+
+
+def record_reviews(db, user_id, category, answer_history, session_id=None, now=None):
+    """Планирует следующие показы слов по ответам (см. review_requests)."""
+    requests = review_requests(user_id, category, answer_history, session_id, now)
+    if not requests:
+        return
+    try:
+        db[SRS_REVIEWS].bulk_write(requests, ordered=False)
+    except BulkWriteError as e:
+        if not only_duplicate_upserts(e):
+            raise
+
+
+def due_cards(db, user_id, category, now=None, limit=20):
+    """Иероглифы слов, которые пора повторить, от самых просроченных."""
+    now = now or datetime.datetime.now()
+    cursor = db[SRS_REVIEWS].find(
+        {'user_id': user_id, 'category': category, 'due_at': {'$lte': now}},
+        {'_id': 0, 'character': 1},
+    ).sort('due_at', ASCENDING).limit(limit)
+    return [row['character'] for row in cursor]
+
+
+def build_deck(db, user_id, category, deck_size, new_cards, now=None):
+    """Колода для сессии повторения: сначала просроченные слова, затем новые."""
+    deck = due_cards(db, user_id, category, now, deck_size)
+    new_limit = min(new_cards, deck_size - len(deck))
+    if new_limit > 0:
+        # Покрывается уникальным индексом (user_id, category, character)
+        studied = {
+            row['character'] for row in db[SRS_REVIEWS].find(
+                {'user_id': user_id, 'category': category}, {'_id': 0, 'character': 1}
+            )
+        }
+        for word in vocabulary.level_words(category):
+            if len(deck) >= deck_size or new_limit <= 0:
+                break
+            if word.character not in studied:
+                deck.append(word.character)
+                new_limit -= 1
+    return deck
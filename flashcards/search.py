@@ -0,0 +1,166 @@
+"""Поисковый индекс по словарю HSK для dictionary_search.
+
+Индекс строится один раз при старте приложения: пиньинь без тонов и перевод
+в нижнем регистре считаются заранее, а по биграммам строятся списки
+вхождений, так что запрос проверяет только подходящих кандидатов.
+
+Совпадения ранжируются: точное совпадение иероглифов, начало пиньиня,
+слово в переводе, любая подстрока. Страница выбирается кучей размера limit
+(heapq.nsmallest), поэтому широкий запрос вроде «a» не сортирует и не
+отдаёт все сотни совпадений; следующая страница — по курсору после
+последнего ключа ранга.
+"""
+import heapq
+import re
+
+from . import vocabulary
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+RANK_EXACT_CHARACTER = 0
+RANK_PINYIN_PREFIX = 1
+RANK_MEANING_WORD = 2
+RANK_SUBSTRING = 3
+
+
+def _grams(text):
+    """Все символы и биграммы строки — ключи для списков вхождений."""
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+def _query_grams(query):
+    if len(query) == 1:
+        return [query]
+    return [query[i:i + 2] for i in range(len(query) - 1)]
+
+
+class SearchIndex:
+    def __init__(self, words=None):
+        # Записи в порядке уровней и словарей — в этом порядке отдаются результаты
+        if words is None:
+            words = vocabulary.all_words()
+        self.entries = []
+        self.pinyin_plain = []
+        self.meaning_lower = []
+        self.characters = []
+        self.pinyin_postings = {}
+        self.meaning_postings = {}
+        self.character_postings = {}
+        for word in words:
+            entry_id = len(self.entries)
+            self.entries.append({
+                'character': word.character,
+                'pinyin': word.pinyin,
+                'meaning': word.meaning,
+                'category': word.level,
+            })
+            self.pinyin_plain.append(word.pinyin_toneless)
+            self.meaning_lower.append(word.meaning_lower)
+            self.characters.append(word.character)
+            for gram in _grams(word.pinyin_toneless):
+                self.pinyin_postings.setdefault(gram, []).append(entry_id)
+            for gram in _grams(word.meaning_lower):
+                self.meaning_postings.setdefault(gram, []).append(entry_id)
+            for gram in _grams(word.character):
+                self.character_postings.setdefault(gram, []).append(entry_id)
+
+    def _candidates(self, postings, query):
+        """Записи, содержащие все биграммы запроса (надмножество совпадений)."""
+        if not query:
+            return range(len(self.entries))
+        lists = []
+        for gram in _query_grams(query):
+            ids = postings.get(gram)
+            if not ids:
+                return ()
+            lists.append(ids)
+        lists.sort(key=len)
+        result = set(lists[0])
+        for ids in lists[1:]:
+            result.intersection_update(ids)
+            if not result:
+                break
+        return result
+
+    def _rank(self, entry_id, query, query_without_tones, word_start):
+        """Уровень совпадения записи (RANK_*) или None, если запрос в ней не встречается."""
+        character = self.characters[entry_id]
+        pinyin = self.pinyin_plain[entry_id]
+        meaning = self.meaning_lower[entry_id]
+        if character == query:
+            return RANK_EXACT_CHARACTER
+        if pinyin.startswith(query_without_tones):
+            return RANK_PINYIN_PREFIX
+        if word_start.search(meaning):
+            return RANK_MEANING_WORD
+        if query_without_tones in pinyin or query in meaning or query in character:
+            return RANK_SUBSTRING
+        return None
+
+    def search(self, query, limit=SEARCH_PAGE_SIZE, cursor=None):
+        """Ищет query (уже в нижнем регистре) в иероглифах, пиньине без тонов и переводе.
+
+        Возвращает (записи страницы, всего совпадений, курсор следующей страницы
+        или None). Порядок — ключ (уровень совпадения, длина слова, номер
+        записи): внутри уровня короткие слова идут раньше, дальше — порядок словаря.
+        """
+        after = decode_cursor(cursor) if cursor else None
+        query_without_tones = vocabulary.remove_tones(query)
+        # Перевод начинается с запроса или запрос стоит после пробела/знака
+        word_start = re.compile(r'(?<!\w)' + re.escape(query))
+        candidates = set(self._candidates(self.pinyin_postings, query_without_tones))
+        candidates.update(self._candidates(self.meaning_postings, query))
+        candidates.update(self._candidates(self.character_postings, query))
+
+        total = 0
+        keys = []
+        for entry_id in candidates:
+            rank = self._rank(entry_id, query, query_without_tones, word_start)
+            if rank is None:
+                continue
+            total += 1
+            key = (rank, len(self.characters[entry_id]), entry_id)
+            if after is None or key > after:
+                keys.append(key)
+        page = heapq.nsmallest(limit, keys)
+        next_cursor = encode_cursor(page[-1]) if len(keys) > limit else None
+        return [self.entries[entry_id] for _, _, entry_id in page], total, next_cursor
+
+
+def encode_cursor(key):
+    return '_'.join(str(part) for part in key)
+
+
+def decode_cursor(cursor):
+    """Разбирает курсор страницы поиска; ValueError, если он испорчен."""
+    parts = cursor.split('_')
+    if len(parts) != 3:
+        raise ValueError(f'Invalid cursor: {cursor!r}')
+    return tuple(int(part) for part in parts)
+
+
+def search_page(data):
+    """Ответ dictionary_search по телу {'query', 'limit', 'cursor'}; ValueError при неверных limit и cursor."""
+    query = str(data.get('query', '')).lower().strip()
+    try:
+        limit = min(max(int(data.get('limit') or SEARCH_PAGE_SIZE), 1), SEARCH_MAX_PAGE_SIZE)
+    except TypeError:
+        raise ValueError(f'Invalid limit: {data.get("limit")!r}')
+    cursor = data.get('cursor') or None
+    if not query:
+        return {'results': [], 'total': 0, 'next_cursor': None}
+    results, total, next_cursor = get_index().search(query, limit, cursor and str(cursor))
+    return {'results': results, 'total': total, 'next_cursor': next_cursor}
+
+
+_index = None
+
+
+def get_index():
+    global _index
+    if _index is None:
+        _index = SearchIndex()
+    return _index
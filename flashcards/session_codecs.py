@@ -0,0 +1,146 @@
+"""Компактная схема игровой сессии.
+
+Вместо списка иероглифов remaining_cards и словаря answer_history
+сессия хранит номера слов внутри уровня (Word.index):
+
+- remaining_bits — битовое множество оставшихся карточек, бит i = слово i;
+- history_correct, history_total — параллельные массивы uint16
+  (little-endian) со счётчиками ответов по номеру слова. Нули в конце
+  массива не хранятся, при чтении массив дополняется до размера уровня.
+
+Все три поля — BSON Binary. Для HSK3 это около сотни байт на оставшиеся
+карточки против десятка килобайт в старом формате.
+"""
+from array import array
+import sys
+
+from bson.binary import Binary
+
+from . import vocabulary
+
+SCHEMA_COMPACT = 2
+COMPACT_FIELDS = ('remaining_bits', 'history_correct', 'history_total')
+LEGACY_FIELDS = ('remaining_cards', 'answer_history')
+MAX_COUNTER = 0xFFFF
+
+
+def is_compact(session):
+    return session.get('schema') == SCHEMA_COMPACT
+
+
+def encode_bits(indexes, size):
+    bits = bytearray((size + 7) // 8)
+    for index in indexes:
+        bits[index >> 3] |= 1 << (index & 7)
+    return Binary(bytes(bits))
+
+
+def decode_bits(data, size):
+    """Номера установленных битов по возрастанию."""
+    return [index for index in range(min(size, len(data) * 8)) if data[index >> 3] >> (index & 7) & 1]
+
+
+def encode_counters(counters):
+    values = array('H', counters)
+    end = len(values)
+    while end and not values[end - 1]:
+        end -= 1
+    values = values[:end]
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return Binary(values.tobytes())
+
+
+def decode_counters(data, size):
+    values = array('H')
+    values.frombytes(bytes(data or b'')[:size * 2])
+    if sys.byteorder != 'little':
+        values.byteswap()
+    values.extend([0] * (size - len(values)))
+    return values
+
+
+class CompactSession:
+    """Распакованное состояние сессии: изменения вносятся в памяти, затем to_fields()."""
+
+    def __init__(self, category, remaining, correct, total):
+        self.category = category
+        self.words = vocabulary.level_words(category)
+        self.remaining = remaining
+        self.correct = correct
+        self.total = total
+
+    @classmethod
+    def new(cls, category):
+        size = vocabulary.level_size(category)
+        return cls(category, set(range(size)), array('H', [0] * size), array('H', [0] * size))
+
+    @classmethod
+    def from_document(cls, session):
+        category = session['category']
+        size = vocabulary.level_size(category)
+        return cls(
+            category,
+            set(decode_bits(session.get('remaining_bits') or b'', size)),
+            decode_counters(session.get('history_correct'), size),
+            decode_counters(session.get('history_total'), size),
+        )
+
+    @classmethod
+    def from_legacy(cls, session):
+        """Переводит старый документ; иероглифы не из уровня отбрасываются."""
+        state = cls.new(session['category'])
+        state.set_remaining(session.get('remaining_cards') or [])
+        state.merge_history(session.get('answer_history') or {})
+        return state
+
+    def _index(self, character):
+        word = vocabulary.get_word(self.category, character)
+        return word.index if word else None
+
+    def _add(self, index, correct, total):
+        self.correct[index] = min(self.correct[index] + correct, MAX_COUNTER)
+        self.total[index] = min(self.total[index] + total, MAX_COUNTER)
+
+    def answer(self, character, correct):
+        """Ответ на оставшуюся карточку. False, если карточки в сессии уже нет."""
+        index = self._index(character)
+        if index is None or index not in self.remaining:
+            return False
+        self.remaining.discard(index)
+        self._add(index, int(bool(correct)), 1)
+        return True
+
+    def merge_history(self, answer_history):
+        """Накопленная история старых клиентов: счётчик не меньше присланного.
+
+        Клиент присылает всю историю сессии при каждом сохранении, поэтому
+        берётся максимум, а не сумма.
+        """
+        for character, history in answer_history.items():
+            index = self._index(character)
+            if index is None:
+                continue
+            correct = min(max(int(history.get('correct', 0)), 0), MAX_COUNTER)
+            total = min(max(int(history.get('total', 0)), 0), MAX_COUNTER)
+            self.correct[index] = max(self.correct[index], correct)
+            self.total[index] = max(self.total[index], total)
+
+    def set_remaining(self, characters):
+        self.remaining = {index for index in map(self._index, characters) if index is not None}
+
+    def remaining_cards(self):
+        return [self.words[index].character for index in sorted(self.remaining)]
+
+    def answer_history(self):
+        return {
+            word.character: {'correct': self.correct[word.index], 'total': self.total[word.index]}
+            for word in self.words if self.total[word.index]
+        }
+
+    def to_fields(self):
+        return {
+            'remaining_bits': encode_bits(self.remaining, len(self.words)),
+            'history_correct': encode_counters(self.correct),
+            'history_total': encode_counters(self.total),
+        }
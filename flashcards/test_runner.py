@@ -0,0 +1,35 @@
+"""Запуск manage.py test на mongomock: тестам не нужен mongod.
+
+djongo и mongo.get_db получают один клиент mongomock в памяти, таблицы
+создаются напрямую через schema editor (migrate на mongomock не работает).
+Сессии в тестах хранятся в подписанных cookie, чтобы не писать файлы в
+SESSION_FILE_PATH.
+"""
+import contextlib
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+TEST_DB_NAME = 'srs_test'
+
+
+class MongomockTestRunner(DiscoverRunner):
+    def setup_databases(self, **kwargs):
+        try:
+            import mongomock
+        except ImportError:
+            raise ImproperlyConfigured('Для тестов нужен пакет mongomock (requirements-dev.txt)')
+        from . import mongo
+        from .testing import create_tables, mongomock_date_add, use_database
+
+        self._stack = contextlib.ExitStack()
+        self._stack.enter_context(use_database(TEST_DB_NAME, client=mongomock.MongoClient()))
+        self._stack.enter_context(mongomock_date_add(mongomock))
+        self._stack.enter_context(override_settings(
+            SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies',
+        ))
+        create_tables(mongo.get_db())
+
+    def teardown_databases(self, old_config, **kwargs):
+        self._stack.close()
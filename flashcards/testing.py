@@ -0,0 +1,83 @@
+"""Подключение к отдельной базе или к mongomock для тестов и команды benchmark.
+
+Все подмены — контекстные менеджеры: по выходу восстанавливаются настройки
+подключения djongo и flashcards.mongo, а mongomock возвращается к исходному
+поведению, так что в процессе после них ничего не остаётся.
+"""
+import contextlib
+import datetime
+from unittest import mock
+
+from django.apps import apps
+from django.db import connection, connections
+from django.test.utils import override_settings
+
+from . import mongo
+from .indexes import ensure_indexes
+from .models import GameSession
+
+
+def _close_clients():
+    from djongo import database
+
+    mongo.close_client()
+    connections.close_all()
+    database.clients.clear()
+
+
+@contextlib.contextmanager
+def use_database(db_name, host=None, client=None):
+    """Направляет djongo и mongo.get_db на базу db_name.
+
+    host — адрес сервера; client — готовый клиент (например, mongomock),
+    который тогда получают оба. Созданные внутри клиенты закрываются на выходе.
+    """
+    from djongo import database
+
+    db_settings = connections['default'].settings_dict
+    saved = dict(db_settings)
+    overrides = {'MONGO_DB_NAME': db_name}
+    if host is not None:
+        overrides['MONGO_URI'] = host
+    _close_clients()
+    with contextlib.ExitStack() as stack:
+        stack.callback(db_settings.update, saved)
+        stack.callback(_close_clients)
+        stack.enter_context(override_settings(**overrides))
+        if client is not None:
+            stack.enter_context(mock.patch.object(database, 'MongoClient', lambda *args, **kwargs: client))
+            stack.enter_context(mock.patch.object(mongo, 'MongoClient', lambda *args, **kwargs: client))
+        db_settings['NAME'] = db_name
+        if host is not None:
+            db_settings['CLIENT'] = {**saved.get('CLIENT', {}), 'host': host}
+        yield
+
+
+@contextlib.contextmanager
+def mongomock_date_add(mongomock):
+    """MongoDB складывает дату с миллисекундами в $add (scheduler.review_update), mongomock — нет."""
+    parser = mongomock.aggregate._Parser
+    original = parser._handle_arithmetic_operator
+
+    def handle(self, operator, values):
+        if operator == '$add' and isinstance(values, (list, tuple)):
+            parsed = list(self.parse_many(values))
+            dates = [value for value in parsed if isinstance(value, datetime.datetime)]
+            if len(dates) == 1 and None not in parsed:
+                millis = sum(value for value in parsed if not isinstance(value, datetime.datetime))
+                return dates[0] + datetime.timedelta(milliseconds=millis)
+        return original(self, operator, values)
+
+    with mock.patch.object(parser, '_handle_arithmetic_operator', handle):
+        yield
+
+
+def create_tables(db):
+    """Таблицы моделей и индексы flashcards в пустой базе (migrate на mongomock не работает)."""
+    with connection.schema_editor() as editor:
+        for model in apps.get_models():
+            # Игровые сессии пишутся через pymongo без поля id, поэтому
+            # таблица djongo с уникальным индексом по id для них не создаётся
+            if model is not GameSession:
+                editor.create_model(model)
+    ensure_indexes(db)
@@ -1,3 +1,444 @@
-from django.test import TestCase
+import datetime
+import json
+import tempfile
+from io import StringIO
 
-# Create your tests here.
+from bson import ObjectId
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from srs_project.settings import redis_cache
+
+from . import page_cache, vocabulary
+from .auth_backends import user_cache
+from .dashboard import decode_cursor as decode_history_cursor
+from .dashboard import encode_cursor as encode_history_cursor
+from .dashboard import history_filter, load_history_page
+from .game_sessions import GAME_SESSIONS, apply_answer, normalize_events, start_session
+from .mongo import get_db
+from .scheduler import DAY_MS, MIN_EASE, SRS_REVIEWS, record_reviews
+from .search import SearchIndex, search_page
+from .session_codecs import (
+    SCHEMA_COMPACT, CompactSession, decode_bits, decode_counters, encode_bits, encode_counters,
+)
+from .word_stats import WORD_STATS
+
+
+class MongoTestCase(TestCase):
+    """TestCase с чистыми коллекциями pymongo и кешами процесса.
+
+    djongo не поддерживает транзакции: таблицы моделей Django очищает сам,
+    а коллекции, в которые представления пишут через pymongo, — этот класс.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.db = get_db()
+        self.clear_mongo()
+
+    def clear_mongo(self):
+        for name in (GAME_SESSIONS, WORD_STATS, SRS_REVIEWS, page_cache.DASHBOARD_VERSIONS):
+            self.db[name].delete_many({})
+        caches[page_cache.CACHE_ALIAS].clear()
+        user_cache.clear()
+
+
+class RegisterTests(MongoTestCase):
+    def test_register_logs_in_and_opens_home(self):
+        response = self.client.post('/register/', {
+            'username': 'student',
+            'password1': 'Xiexie-ni-2024',
+            'password2': 'Xiexie-ni-2024',
+        })
+        self.assertRedirects(response, '/', fetch_redirect_response=False)
+        user = User.objects.get(username='student')
+        self.assertEqual(int(self.client.session['_auth_user_id']), user.pk)
+
+        response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['user'].pk, user.pk)
+
+
+class SessionStoreTests(MongoTestCase):
+    def test_session_saved_outside_middleware_is_read_back(self):
+        # force_login сохраняет сессию исходным SessionStore, запрос читает её через TimedSessionMiddleware
+        user = User.objects.create_user('reader', password='Xiexie-ni-2024')
+        with tempfile.TemporaryDirectory() as path, override_settings(
+            SESSION_ENGINE='django.contrib.sessions.backends.file', SESSION_FILE_PATH=path,
+        ):
+            self.client.force_login(user)
+            response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['user'].pk, user.pk)
+
+
+    def test_cache_sessions_on_redis_stand_in(self):
+        user = User.objects.create_user('cached', password='Xiexie-ni-2024')
+        with override_settings(
+            SESSION_ENGINE='django.contrib.sessions.backends.cache',
+            CACHES={**settings.CACHES, 'sessions': redis_cache('SESSION_CACHE_URL', 'fakeredis://localhost:6379/1')},
+        ):
+            caches['sessions'].clear()
+            self.client.force_login(user)
+            response = self.client.get('/')
+            self.assertEqual(response.context['user'].pk, user.pk)
+            self.client.logout()
+            self.assertEqual(self.client.get('/').status_code, 302)
+
+
+class PageCacheTests(MongoTestCase):
+    def test_version_is_shared_between_processes(self):
+        self.assertEqual(page_cache.get_or_build(7, 'home', lambda: 'old'), 'old')
+        # Другой воркер меняет версию в MongoDB, не трогая локальный кеш этого процесса
+        self.db[page_cache.DASHBOARD_VERSIONS].update_one(*page_cache.version_bump(7), upsert=True)
+        self.assertEqual(page_cache.get_or_build(7, 'home', lambda: 'new'), 'new')
+        self.assertEqual(page_cache.get_or_build(7, 'home', lambda: 'newer'), 'new')
+
+
+    def test_dashboard_cache_on_redis_stand_in(self):
+        with override_settings(
+            CACHES={**settings.CACHES, 'dashboard': redis_cache('DASHBOARD_CACHE_URL', 'fakeredis://localhost:6379/2')},
+        ):
+            caches['dashboard'].clear()
+            self.assertEqual(page_cache.get_or_build(7, 'home', lambda: {'level': 'old'}), {'level': 'old'})
+            self.assertEqual(page_cache.get_or_build(7, 'home', lambda: {'level': 'new'}), {'level': 'old'})
+            page_cache.bump_version(7)
+            self.assertEqual(page_cache.get_or_build(7, 'home', lambda: {'level': 'new'}), {'level': 'new'})
+
+
+class NormalizeEventsTests(SimpleTestCase):
+    def test_drops_applied_and_repeated_seq(self):
+        events = normalize_events([
+            {'seq': 4, 'character': '你', 'correct': 1},
+            {'seq': 2, 'character': '我', 'correct': True},
+            {'seq': 3, 'character': '他', 'correct': False},
+            {'seq': 4, 'character': '好', 'correct': False},
+        ], last_seq=2)
+        self.assertEqual(events, [
+            {'seq': 3, 'character': '他', 'correct': False},
+            {'seq': 4, 'character': '好', 'correct': False},
+        ])
+
+    def test_rejects_malformed_events(self):
+        for events in ({}, ['a'], [{'seq': True, 'character': '我'}], [{'seq': 0, 'character': '我'}],
+                       [{'seq': '1', 'character': '我'}], [{'seq': 1, 'character': ''}]):
+            with self.subTest(events=events), self.assertRaises(ValueError):
+                normalize_events(events)
+
+
+@override_settings(GAME_SESSION_SCHEMA='legacy')
+class EndGameTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('player', password='Xiexie-ni-2024')
+        self.client.force_login(self.user)
+        session, _ = start_session(self.db, self.user.id, 'HSK1')
+        self.url = f'/game/end/{session["_id"]}/'
+
+    def post(self, body):
+        return self.client.post(self.url, json.dumps(body), content_type='application/json')
+
+    def test_repeated_answer_history_is_counted_once(self):
+        # Старый клиент присылает всю answer_history при каждом сохранении
+        body = {'answer_history': {'我': {'correct': 1, 'total': 1}}}
+        for schema in ('legacy', 'compact'):
+            with self.subTest(schema=schema), override_settings(GAME_SESSION_SCHEMA=schema):
+                self.clear_mongo()
+                session, _ = start_session(self.db, self.user.id, 'HSK1')
+                self.url = f'/game/end/{session["_id"]}/'
+                self.assertEqual(self.post(body).status_code, 200)
+                self.assertEqual(self.post(body).status_code, 200)
+                stats = self.db[WORD_STATS].find_one({'user_id': self.user.id, 'character': '我'})
+                self.assertEqual((stats['correct'], stats['total']), (1, 1))
+                doc = self.db[GAME_SESSIONS].find_one({'_id': session['_id']})
+                history = CompactSession.from_document(doc).answer_history() if schema == 'compact' \
+                    else doc['answer_history']
+                self.assertEqual(history, {'我': {'correct': 1, 'total': 1}})
+
+    def test_only_matched_events_reach_word_stats(self):
+        response = self.post({'events': [
+            {'seq': 1, 'character': '我', 'correct': True},
+            {'seq': 2, 'character': '不存在', 'correct': True},
+        ]})
+        self.assertEqual(response.json(), {'status': 'success', 'last_seq': 2})
+        characters = {doc['character'] for doc in self.db[WORD_STATS].find({'user_id': self.user.id})}
+        self.assertEqual(characters, {'我'})
+
+    def test_repeated_card_in_batch_counts_first_answer(self):
+        response = self.post({'events': [
+            {'seq': 1, 'character': '我', 'correct': False},
+            {'seq': 2, 'character': '我', 'correct': True},
+        ]})
+        self.assertEqual(response.json(), {'status': 'success', 'last_seq': 2})
+        doc = self.db[GAME_SESSIONS].find_one({'user_id': self.user.id})
+        self.assertEqual((doc['correct_answers'], doc['total_answers'], doc['last_seq']), (0, 1, 1))
+        self.assertEqual(doc['answer_history'], {'我': {'correct': 0, 'total': 1}})
+
+    def test_replayed_batch_is_applied_once(self):
+        events = [
+            {'seq': 1, 'character': '我', 'correct': True},
+            {'seq': 2, 'character': '你', 'correct': False},
+        ]
+        for schema in ('legacy', 'compact'):
+            with self.subTest(schema=schema), override_settings(GAME_SESSION_SCHEMA=schema):
+                self.clear_mongo()
+                session, _ = start_session(self.db, self.user.id, 'HSK1')
+                self.url = f'/game/end/{session["_id"]}/'
+                for _ in range(2):
+                    self.assertEqual(self.post({'events': events}).json(), {'status': 'success', 'last_seq': 2})
+                doc = self.db[GAME_SESSIONS].find_one({'_id': session['_id']})
+                self.assertEqual((doc['correct_answers'], doc['total_answers'], doc['last_seq']), (1, 2, 2))
+                stats = {row['character']: (row['correct'], row['total'])
+                         for row in self.db[WORD_STATS].find({'user_id': self.user.id})}
+                self.assertEqual(stats, {'我': (1, 1), '你': (0, 1)})
+
+
+class SubmitAnswerTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('player', password='Xiexie-ni-2024')
+        self.client.force_login(self.user)
+
+    def post(self, session_id, body):
+        return self.client.post(f'/game/answer/{session_id}/', json.dumps(body), content_type='application/json')
+
+    def test_answer_is_applied_once(self):
+        for schema in ('legacy', 'compact'):
+            with self.subTest(schema=schema), override_settings(GAME_SESSION_SCHEMA=schema):
+                self.clear_mongo()
+                session, _ = start_session(self.db, self.user.id, 'HSK1')
+                body = {'seq': 1, 'character': '我', 'correct': True}
+                self.assertEqual(self.post(session['_id'], body).json(), {'status': 'success'})
+                self.assertEqual(self.post(session['_id'], body).json(), {'status': 'ignored'})
+                doc = self.db[GAME_SESSIONS].find_one({'_id': session['_id']})
+                self.assertEqual((doc['correct_answers'], doc['total_answers'], doc['last_seq']), (1, 1, 1))
+                stats = self.db[WORD_STATS].find_one({'user_id': self.user.id, 'character': '我'})
+                self.assertEqual((stats['correct'], stats['total']), (1, 1))
+
+    def test_bad_input_is_rejected(self):
+        session, _ = start_session(self.db, self.user.id, 'HSK1')
+        self.assertEqual(self.post('not-an-id', {'character': '我'}).status_code, 400)
+        self.assertEqual(self.post(session['_id'], {'character': ''}).status_code, 400)
+        self.assertEqual(self.post(session['_id'], {'character': '我', 'seq': 0}).status_code, 400)
+
+
+class SearchTests(SimpleTestCase):
+    QUERIES = ['a', 'ni', 'hao', 'hǎo', 'shi', 'zh', '我', '中国', 'to', 'the', 'good', 'xyz', 'q']
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.index = SearchIndex()
+
+    def brute_force(self, query):
+        query_without_tones = vocabulary.remove_tones(query)
+        return {
+            entry_id for entry_id in range(len(self.index.entries))
+            if query_without_tones in self.index.pinyin_plain[entry_id]
+            or query in self.index.meaning_lower[entry_id]
+            or query in self.index.characters[entry_id]
+        }
+
+    def test_index_matches_brute_force_scan(self):
+        for query in self.QUERIES:
+            with self.subTest(query=query):
+                expected = self.brute_force(query)
+                results, total, next_cursor = self.index.search(query, limit=len(self.index.entries))
+                self.assertEqual(total, len(expected))
+                self.assertEqual(len(results), len(expected))
+                self.assertEqual(
+                    {id(entry) for entry in results}, {id(self.index.entries[entry_id]) for entry_id in expected},
+                )
+                self.assertIsNone(next_cursor)
+
+    def test_exact_character_and_pinyin_prefix_come_first(self):
+        results, _, _ = self.index.search('我')
+        self.assertEqual(results[0]['character'], '我')
+        results, total, _ = self.index.search('ni', limit=5)
+        self.assertGreater(total, 5)
+        for entry in results:
+            self.assertTrue(vocabulary.remove_tones(entry['pinyin']).lower().startswith('ni'), entry)
+
+    def test_cursor_pages_cover_all_results_once(self):
+        everything, total, _ = self.index.search('a', limit=len(self.index.entries))
+        pages = []
+        cursor = None
+        while True:
+            page, page_total, cursor = self.index.search('a', limit=7, cursor=cursor)
+            self.assertEqual(page_total, total)
+            pages.extend(page)
+            if cursor is None:
+                break
+        self.assertEqual([id(entry) for entry in pages], [id(entry) for entry in everything])
+
+    def test_bad_cursor_and_limit(self):
+        for data in ({'query': 'a', 'cursor': 'x'}, {'query': 'a', 'cursor': '1_2'},
+                     {'query': 'a', 'cursor': '1_a_2'}, {'query': 'a', 'limit': 'ten'}):
+            with self.subTest(data=data), self.assertRaises(ValueError):
+                search_page(data)
+        self.assertEqual(search_page({'query': '  '}), {'results': [], 'total': 0, 'next_cursor': None})
+
+
+class SearchViewTests(MongoTestCase):
+    def test_bad_cursor_is_rejected(self):
+        self.client.force_login(User.objects.create_user('searcher', password='Xiexie-ni-2024'))
+        response = self.client.post(
+            '/dictionary/search/', json.dumps({'query': 'a', 'cursor': 'x'}), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            '/dictionary/search/', json.dumps({'query': 'a', 'limit': 3}), content_type='application/json',
+        )
+        self.assertEqual(len(response.json()['results']), 3)
+
+
+class SessionCodecTests(SimpleTestCase):
+    def test_bits_round_trip(self):
+        indexes = [0, 1, 7, 8, 15, 64, 149]
+        data = encode_bits(indexes, 150)
+        self.assertEqual(len(data), 19)
+        self.assertEqual(decode_bits(data, 150), indexes)
+        self.assertEqual(decode_bits(data, 100), [0, 1, 7, 8, 15, 64])
+        self.assertEqual(decode_bits(b'', 150), [])
+
+    def test_counters_round_trip_without_trailing_zeros(self):
+        counters = [3, 0, 0xFFFF, 1, 0, 0]
+        data = encode_counters(counters)
+        self.assertEqual(len(data), 8)
+        self.assertEqual(list(decode_counters(data, 6)), counters)
+        self.assertEqual(list(decode_counters(None, 3)), [0, 0, 0])
+
+    def test_legacy_fields_survive_compact_document(self):
+        words = vocabulary.level_words('HSK1')
+        remaining = [word.character for word in words[5:]]
+        history = {words[0].character: {'correct': 2, 'total': 3}, words[1].character: {'correct': 0, 'total': 1}}
+        state = CompactSession.from_legacy({
+            'category': 'HSK1',
+            'remaining_cards': remaining + ['不在'],
+            'answer_history': {**history, '不在': {'correct': 1, 'total': 1}},
+        })
+        restored = CompactSession.from_document({'category': 'HSK1', **state.to_fields()})
+        self.assertEqual(restored.remaining_cards(), remaining)
+        self.assertEqual(restored.answer_history(), history)
+
+    def test_answer_only_once(self):
+        state = CompactSession.new('HSK1')
+        character = vocabulary.level_words('HSK1')[0].character
+        self.assertTrue(state.answer(character, True))
+        self.assertFalse(state.answer(character, False))
+        self.assertFalse(state.answer('不在', True))
+        self.assertEqual(state.answer_history(), {character: {'correct': 1, 'total': 1}})
+
+
+@override_settings(GAME_SESSION_SCHEMA='legacy')
+class MigrateSessionSchemaTests(MongoTestCase):
+    def test_round_trip_between_schemas(self):
+        db = self.db
+        session, _ = start_session(db, 1, 'HSK1')
+        words = vocabulary.level_words('HSK1')
+        apply_answer(db, session['_id'], 1, words[0].character, True, seq=1)
+        apply_answer(db, session['_id'], 1, words[1].character, False, seq=2)
+        before = db[GAME_SESSIONS].find_one({'_id': session['_id']})
+
+        call_command('migrate_session_schema', to='compact', stdout=StringIO())
+        compact = db[GAME_SESSIONS].find_one({'_id': session['_id']})
+        self.assertEqual(compact['schema'], SCHEMA_COMPACT)
+        self.assertNotIn('remaining_cards', compact)
+        self.assertNotIn('answer_history', compact)
+
+        call_command('migrate_session_schema', to='legacy', stdout=StringIO())
+        legacy = db[GAME_SESSIONS].find_one({'_id': session['_id']})
+        self.assertNotIn('schema', legacy)
+        self.assertNotIn('remaining_bits', legacy)
+        self.assertEqual(sorted(legacy['remaining_cards']), sorted(before['remaining_cards']))
+        self.assertEqual(legacy['answer_history'], before['answer_history'])
+        self.assertEqual((legacy['correct_answers'], legacy['total_answers']), (1, 2))
+
+    def test_dry_run_changes_nothing(self):
+        db = self.db
+        session, _ = start_session(db, 1, 'HSK2')
+        out = StringIO()
+        call_command('migrate_session_schema', to='compact', dry_run=True, stdout=out)
+        self.assertIn('would convert to compact: 1', out.getvalue())
+        self.assertNotIn('schema', db[GAME_SESSIONS].find_one({'_id': session['_id']}))
+
+
+class SchedulerTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = datetime.datetime(2024, 3, 1, 12, 0)
+
+    def review(self, correct, session_id=None):
+        record_reviews(self.db, 1, 'HSK1', {'我': {'correct': int(correct), 'total': 1}},
+                       session_id or ObjectId(), self.now)
+        return self.db[SRS_REVIEWS].find_one({'user_id': 1, 'character': '我'})
+
+    def test_correct_answers_grow_interval(self):
+        intervals = []
+        for _ in range(4):
+            doc = self.review(True)
+            intervals.append(doc['interval'])
+            # Ответ «верно» соответствует оценке 4: фактор лёгкости не меняется
+            self.assertAlmostEqual(doc['ease'], 2.5)
+        self.assertEqual(intervals, [1, 6, 15, 38])
+        self.assertEqual(doc['repetitions'], 4)
+        self.assertEqual(doc['due_at'], self.now + datetime.timedelta(milliseconds=38 * DAY_MS))
+
+    def test_wrong_answer_resets_and_lowers_ease(self):
+        self.review(True)
+        self.review(True)
+        doc = self.review(False)
+        self.assertEqual((doc['interval'], doc['repetitions'], doc['lapses']), (1, 0, 1))
+        self.assertAlmostEqual(doc['ease'], 1.96)
+        self.assertEqual(doc['due_at'], self.now + datetime.timedelta(days=1))
+        doc = self.review(False)
+        self.assertEqual(doc['lapses'], 2)
+        self.assertAlmostEqual(doc['ease'], 1.42)
+        doc = self.review(False)
+        self.assertAlmostEqual(doc['ease'], MIN_EASE)
+        doc = self.review(True)
+        self.assertEqual((doc['interval'], doc['repetitions']), (1, 1))
+
+    def test_same_session_is_scheduled_once(self):
+        session_id = ObjectId()
+        self.review(True, session_id)
+        doc = self.review(True, session_id)
+        self.assertEqual((doc['interval'], doc['repetitions']), (1, 1))
+
+
+class HistoryCursorTests(MongoTestCase):
+    def test_cursor_round_trip(self):
+        session = {'_id': ObjectId(), 'created_at': datetime.datetime(2024, 3, 1, 12, 30, 15, 250000)}
+        self.assertEqual(decode_history_cursor(encode_history_cursor(session)), (session['created_at'], session['_id']))
+
+    def test_bad_cursors_raise_value_error(self):
+        for cursor in ('abc', '123', '123_', '123_zz', 'x_' + str(ObjectId()), '9' * 30 + '_' + str(ObjectId())):
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                history_filter(1, cursor)
+        self.assertEqual(history_filter(1, ''), {'user_id': 1})
+
+    def test_pages_with_equal_created_at(self):
+        db = self.db
+        created_at = datetime.datetime(2024, 3, 1, 12, 0)
+        ids = [ObjectId() for _ in range(5)]
+        db[GAME_SESSIONS].insert_many([
+            {'_id': session_id, 'user_id': 1, 'category': 'HSK1', 'correct_answers': 0, 'total_answers': 0,
+             'created_at': created_at}
+            for session_id in ids
+        ])
+        seen = []
+        cursor = None
+        while True:
+            sessions, cursor = load_history_page(db, 1, cursor, limit=2)
+            seen.extend(session['id'] for session in sessions)
+            if cursor is None:
+                break
+        self.assertEqual(seen, [str(session_id) for session_id in reversed(ids)])
+
+    def test_stats_view_redirects_on_bad_cursor(self):
+        self.client.force_login(User.objects.create_user('historian', password='Xiexie-ni-2024'))
+        response = self.client.get('/stats/', {'cursor': '123_zz'})
+        self.assertRedirects(response, '/stats/', fetch_redirect_response=False)
+        self.assertEqual(self.client.get('/stats/').status_code, 200)
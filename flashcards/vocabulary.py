@@ -0,0 +1,124 @@
+"""Словарь HSK: все уровни загружаются один раз при импорте.
+
+Каждое слово — компактная запись Word с целочисленным id (сквозным по всем
+уровням) и номером внутри уровня. Строки интернированы, производные поля
+(пиньинь без тонов, перевод в нижнем регистре) посчитаны заранее.
+Представления и формы получают слова только через этот модуль.
+"""
+import logging
+import sys
+import unicodedata
+
+from .hsk_data import HSK1_CHARACTERS
+from .hsk2_data import HSK2_CHARACTERS
+from .hsk3_data import HSK3_CHARACTERS
+
+_SOURCES = (
+    ('HSK1', HSK1_CHARACTERS),
+    ('HSK2', HSK2_CHARACTERS),
+    ('HSK3', HSK3_CHARACTERS),
+)
+
+LEVELS = tuple(level for level, _ in _SOURCES)
+
+logger = logging.getLogger(__name__)
+
+
+def remove_tones(pinyin_str):
+    """Преобразует пиньинь с тонами в пиньинь без тонов, убирая пробелы."""
+    try:
+        # Нормализуем строку, чтобы разделить диакритические знаки
+        normalized = unicodedata.normalize('NFD', pinyin_str.lower())
+        # Удаляем диакритические знаки (тоны)
+        without_tones = ''.join(c for c in normalized if unicodedata.category(c) != 'Mn')
+        # Убираем пробелы
+        return without_tones.replace(' ', '')
+    except Exception:
+        logger.warning('Error removing tones from pinyin %r', pinyin_str, exc_info=True)
+        return pinyin_str.replace(' ', '')  # Возвращаем строку без пробелов в случае ошибки
+
+
+class Word:
+    __slots__ = ('id', 'level', 'index', 'character', 'pinyin', 'meaning', 'pinyin_toneless', 'meaning_lower')
+
+    def __init__(self, word_id, level, index, character, pinyin, meaning):
+        self.id = word_id
+        self.level = level
+        self.index = index
+        self.character = sys.intern(character)
+        self.pinyin = sys.intern(pinyin)
+        self.meaning = sys.intern(meaning)
+        self.pinyin_toneless = sys.intern(remove_tones(pinyin))
+        self.meaning_lower = meaning.lower()
+
+    def as_dict(self):
+        return {'character': self.character, 'pinyin': self.pinyin, 'meaning': self.meaning}
+
+    def __repr__(self):
+        return f'Word({self.id}, {self.level}, {self.character!r})'
+
+
+def _load():
+    words = []
+    by_level = {}
+    by_character = {}
+    for level, source in _SOURCES:
+        level = sys.intern(level)
+        level_words = []
+        for index, (character, data) in enumerate(source.items()):
+            word = Word(len(words), level, index, character, data['pinyin'], data['meaning'])
+            words.append(word)
+            level_words.append(word)
+        by_level[level] = tuple(level_words)
+        by_character[level] = {word.character: word for word in level_words}
+    return tuple(words), by_level, by_character
+
+
+_words, _by_level, _by_character = _load()
+
+LEVEL_SIZES = {level: len(words) for level, words in _by_level.items()}
+_level_characters = {level: frozenset(characters) for level, characters in _by_character.items()}
+# Порядок для списков выбора — по пиньиню, как в форме создания карточки
+_by_pinyin = {
+    level: tuple(sorted(words, key=lambda word: (word.pinyin_toneless, word.pinyin, word.index)))
+    for level, words in _by_level.items()
+}
+
+
+def is_level(level):
+    return level in _by_level
+
+
+def level_words(level):
+    """Слова уровня в исходном порядке словаря."""
+    return _by_level[level]
+
+
+def level_words_by_pinyin(level):
+    return _by_pinyin[level]
+
+
+def level_size(level):
+    return LEVEL_SIZES.get(level, 0)
+
+
+def level_characters(level):
+    return _level_characters.get(level, frozenset())
+
+
+def get_word(level, character):
+    """Слово уровня по иероглифу или None. Один иероглиф может быть в нескольких уровнях."""
+    return _by_character.get(level, {}).get(character)
+
+
+def word_by_id(word_id):
+    return _words[word_id]
+
+
+def all_words():
+    return _words
+
+
+def level_dict(level):
+    """Уровень в формате исходных данных: {character: {'pinyin', 'meaning'}}."""
+    return {word.character: {'pinyin': word.pinyin, 'meaning': word.meaning} for word in _by_level[level]}
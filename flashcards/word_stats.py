@@ -0,0 +1,117 @@
+"""Накопительная статистика ответов по словам: документ на (user, category, character).
+
+Счётчики увеличиваются атомарно при каждом сохранении ответов, а точность
+хранится рядом с ними, поэтому слабые и сильные слова выбираются по индексу,
+без просмотра истории всех сессий.
+"""
+import datetime
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+
+WORD_STATS = 'flashcards_word_stats'
+
+INDEXES = [
+    ([('user_id', ASCENDING), ('category', ASCENDING), ('character', ASCENDING)], {'unique': True}),
+    ([('user_id', ASCENDING), ('accuracy', ASCENDING)], {}),
+]
+
+WEAK_THRESHOLD = 0.5
+STRONG_THRESHOLD = 0.8
+TOP_WORDS = 5
+
+
+def _increment(correct, total, now, session_id=None):
+    # Пайплайн обновления: тот же $inc, но точность пересчитывается в той же
+    # атомарной операции из уже увеличенных счётчиков.
+    counters = {
+        'correct': {'$add': [{'$ifNull': ['$correct', 0]}, correct]},
+        'total': {'$add': [{'$ifNull': ['$total', 0]}, total]},
+        'updated_at': now,
+    }
+    if session_id is not None:
+        counters['last_session_id'] = session_id
+    return [
+        {'$set': counters},
+        {'$set': {
+            'accuracy': {'$cond': [
+                {'$gt': ['$total', 0]},
+                {'$divide': ['$correct', '$total']},
+                None,
+            ]},
+        }},
+    ]
+
+
+def answer_requests(user_id, category, answer_history, session_id=None, now=None):
+    """Операции bulk_write для ответов вида {character: {'correct': int, 'total': int}}.
+
+    С session_id запись идемпотентна: в одной сессии на каждое слово отвечают
+    один раз, поэтому повторная доставка тех же ответов пропускается.
+    """
+    now = now or datetime.datetime.now()
+    requests = []
+    for character, history in answer_history.items():
+        correct = history.get('correct', 0)
+        total = history.get('total', 0)
+        if not correct and not total:
+            continue
+        query = {'user_id': user_id, 'category': category, 'character': character}
+        if session_id is not None:
+            query['last_session_id'] = {'$ne': session_id}
+        requests.append(UpdateOne(query, _increment(correct, total, now, session_id), upsert=True))
+    return requests
+
+
+def only_duplicate_upserts(error):
+    """True, если bulk_write упал лишь на уже учтённых ответах.
+
+    Фильтр с last_session_id не нашёл документ, а upsert упёрся в уникальный
+    индекс (user_id, category, character) — такие ошибки пропускаются.
+    """
+    return all(item.get('code') == 11000 for item in error.details.get('writeErrors', []))
+
+
+def record_answers(db, user_id, category, answer_history, session_id=None):
+    """Добавляет ответы к статистике слов (см. answer_requests)."""
+    requests = answer_requests(user_id, category, answer_history, session_id)
+    if not requests:
+        return
+    try:
+        db[WORD_STATS].bulk_write(requests, ordered=False)
+    except BulkWriteError as e:
+        if not only_duplicate_upserts(e):
+            raise
+
+
+def top_words(db, user_id):
+    """Возвращает (weak, strong) — по TOP_WORDS документов word_stats."""
+    collection = db[WORD_STATS]
+    weak = collection.find(
+        {'user_id': user_id, 'accuracy': {'$lt': WEAK_THRESHOLD}},
+        {'_id': 0, 'category': 1, 'character': 1, 'accuracy': 1},
+    ).sort('accuracy', ASCENDING).limit(TOP_WORDS)
+    strong = collection.find(
+        {'user_id': user_id, 'accuracy': {'$gte': STRONG_THRESHOLD}},
+        {'_id': 0, 'category': 1, 'character': 1, 'accuracy': 1},
+    ).sort('accuracy', DESCENDING).limit(TOP_WORDS)
+    return list(weak), list(strong)
+
+
+def backfill_pipeline(user_id=None):
+    """Пересчитывает статистику по answer_history всех сохранённых сессий."""
+    match = {'user_id': user_id} if user_id is not None else {}
+    return [
+        {'$match': match},
+        {'$project': {
+            'user_id': 1,
+            'category': 1,
+            'history': {'$objectToArray': {'$ifNull': ['$answer_history', {}]}},
+        }},
+        {'$unwind': '$history'},
+        {'$group': {
+            '_id': {'user_id': '$user_id', 'category': '$category', 'character': '$history.k'},
+            'correct': {'$sum': '$history.v.correct'},
+            'total': {'$sum': '$history.v.total'},
+        }},
+    ]
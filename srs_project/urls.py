@@ -1,8 +1,14 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 from django.contrib.auth import views as auth_views
 from flashcards import views
 
+if settings.ASYNC_VIEWS:
+    from flashcards import async_views as io_views
+else:
+    io_views = views
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('accounts/login/', auth_views.LoginView.as_view(template_name='registration/login.html'), name='login'),
@@ -14,8 +20,15 @@ urlpatterns = [
     path('collections/create/', views.create_collection, name='create_collection'),
     path('game_select_category/', views.game_select_category, name='game_select_category'),
     path('game/<str:category>/', views.game, name='game'),
-    path('game/end/<str:session_id>/', views.end_game, name='end_game'),  # Изменено на str
+    path('game/end/<str:session_id>/', io_views.end_game, name='end_game'),  # Изменено на str
+    path('game/answer/<str:session_id>/', views.submit_answer, name='submit_answer'),
     path('stats/', views.stats, name='stats'),
+    path('stats/chart/', views.stats_chart, name='stats_chart'),
     path('dictionary/', views.dictionary, name='dictionary'),
-    path('dictionary/search/', views.dictionary_search, name='dictionary_search'),
+    path('dictionary/search/', io_views.dictionary_search, name='dictionary_search'),
+    path('vocabulary/<str:level>/choices/', views.character_choices, name='character_choices'),
+    path('vocabulary/<str:level>/<str:version>.json', views.vocabulary_json, name='vocabulary_json'),
+    path('health/mongo/', views.mongo_health, name='mongo_health'),
+    path('health/caches/', views.cache_health, name='cache_health'),
+    path('metrics', views.metrics_view, name='metrics'),
 ]
\ No newline at end of file